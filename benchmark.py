@@ -0,0 +1,249 @@
+"""Mide el rendimiento de los motores de conciliación con datos sintéticos.
+
+Uso:
+    python benchmark.py [--tamanos 1k,10k,100k,1M] [--motores compare_records,simple,multiple,comparador3]
+                        [--formato xlsx] [--datos datos_benchmark] [--salida resultados_benchmark.json]
+                        [--base resultados_anteriores.json] [--tolerancia 0.2]
+
+Los datos se generan con datos_sinteticos.py (se reutilizan si ya existen). Por cada motor y
+tamaño se toman los tiempos de carga, normalización, emparejamiento y escritura (los motores que
+hacen dos pasos juntos los informan juntos) y se guardan en un JSON. Con --base se compara contra
+un JSON anterior y se listan los motores que se pusieron más lentos que la tolerancia.
+La caché de cache_excel se desactiva para medir siempre la lectura real de los archivos.
+"""
+import os
+import io
+import sys
+import json
+import shutil
+import argparse
+import platform
+import contextlib
+import importlib.util
+from datetime import datetime
+
+# Sin caché en disco, también para los procesos del pool de carga
+os.environ['GUITA_ZOKO_NO_CACHE'] = '1'
+
+import pandas as pd
+import cache_excel
+from carga_paralela import WORKERS
+from datos_sinteticos import TAMANOS, ensure_dataset
+from tiempos import StageTimer
+
+cache_excel.CACHE_ENABLED = False
+
+MOTORES = ['compare_records', 'simple', 'multiple', 'comparador3']
+
+# Diferencia mínima (en segundos) para contar una regresión: por debajo pesa más el ruido de la medición
+MIN_REGRESSION_S = 0.25
+
+
+def load_module(name, filename):
+    """Importa un script del repositorio por nombre de archivo (comparador3.0.py no es importable con import)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_compare_records(user_file, hospital_files, output_dir, timer):
+    cp = load_module('comprar_pacientes', 'comprar_pacientes.py')
+
+    with timer('carga'):
+        user_raw = cp.read_relevant_columns(user_file)
+        hospital_raw = [cp.read_relevant_columns(path) for path in hospital_files]
+    with timer('normalizacion'):
+        user_df = cp.process_dataframe(user_raw, user_file)
+        hospital_df = pd.concat([cp.process_dataframe(df, path) for df, path in zip(hospital_raw, hospital_files)],
+                                ignore_index=True)
+    with timer('emparejamiento'):
+        sheets = cp.find_discrepancies(user_df, hospital_df)
+    with timer('escritura'):
+        cp.write_report(os.path.join(output_dir, 'discrepancias_pacientes.xlsx'), sheets,
+                        [('Datos_Usuario', user_df), ('Datos_Hospital', hospital_df)])
+
+
+def bench_simple(user_file, hospital_files, output_dir, timer):
+    module = load_module('reversionadoDeLogicaSimple', 'reversionadoDeLogicaSimple.py')
+    processor = module.HistoriaClinicaProcessor()
+    processor.archivo_control = user_file
+    processor.archivos_hospital = list(hospital_files)
+    processor.archivo_salida = os.path.join(output_dir, 'presentes_no_pagados.xlsx')
+
+    with timer('carga_y_normalizacion_control'):
+        if not processor.procesar_archivo_control():
+            raise RuntimeError("Falló el procesamiento del archivo de control")
+    with timer('carga_hospital_y_emparejamiento'):
+        if not processor.procesar_archivos_hospital():
+            raise RuntimeError("Falló el procesamiento de los archivos del hospital")
+    with timer('escritura'):
+        if not processor.guardar_resultados():
+            raise RuntimeError("Falló la escritura de resultados")
+
+
+def bench_multiple(user_file, hospital_files, output_dir, timer):
+    module = load_module('reversionadoDeLogicaMultiple', 'reversionadoDeLogicaMultiple.py')
+    processor = module.HistoriaClinicaProcessor()
+    processor.archivos_control = [user_file]
+    processor.archivos_hospital = list(hospital_files)
+    processor.archivo_salida = os.path.join(output_dir, 'presentes_no_pagados.xlsx')
+    processor.archivo_salida_contra = os.path.join(output_dir, 'pagos_en_contra.xlsx')
+    processor.archivo_tiempos = os.path.join(output_dir, 'reporte_tiempos.json')
+
+    with timer('carga_y_normalizacion_control'):
+        if not processor.procesar_archivos_control():
+            raise RuntimeError("Falló el procesamiento de los archivos de control")
+    with timer('carga_hospital_y_emparejamiento'):
+        if not processor.procesar_archivos_hospital():
+            raise RuntimeError("Falló el procesamiento de los archivos del hospital")
+    with timer('escritura'):
+        if not processor.guardar_resultados():
+            raise RuntimeError("Falló la escritura de resultados")
+
+
+def bench_comparador3(user_file, hospital_files, output_dir, timer):
+    module = load_module('comparador3', 'comparador3.0.py')
+    matcher = module.PatientMatcher()
+
+    def load(path, key_columns_only):
+        data, error = matcher.load_excel_file(path, key_columns_only)
+        if error:
+            raise RuntimeError(error)
+        return data
+
+    with timer('carga'):
+        hospital_data_list = [load(path, True) for path in hospital_files]
+        user_data_list = [load(user_file, False)]
+    with timer('normalizacion'):
+        hospital_index = matcher.build_hospital_index(hospital_data_list)
+    with timer('emparejamiento'):
+        missing_patients = matcher.find_missing_patients(user_data_list, hospital_index)
+    with timer('escritura'):
+        matcher.build_report_dataframe(missing_patients).to_excel(
+            os.path.join(output_dir, 'pacientes_usuario_no_pagados.xlsx'), index=False)
+
+
+BENCHMARKS = {
+    'compare_records': bench_compare_records,
+    'simple': bench_simple,
+    'multiple': bench_multiple,
+    'comparador3': bench_comparador3,
+}
+
+
+def count_rows(path):
+    """Filas de datos de un archivo (sin el encabezado)."""
+    first_column = cache_excel.read_excel_header(path).columns[0]
+    return len(cache_excel.read_excel_cached(path, usecols=[first_column]))
+
+
+def run_benchmark(engine, size, user_file, hospital_files, output_dir):
+    """Corre un motor sobre un conjunto de datos y devuelve su resultado para el JSON."""
+    os.makedirs(output_dir, exist_ok=True)
+    timer = StageTimer()
+    error = None
+    try:
+        # Los motores imprimen su propio log; en el benchmark solo interesan los tiempos
+        with contextlib.redirect_stdout(io.StringIO()):
+            BENCHMARKS[engine](user_file, hospital_files, output_dir, timer)
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+    # Total = suma de las etapas (sin contar la importación del módulo del motor)
+    total = sum(timer.stages.values())
+    user_rows = TAMANOS[size]
+    return {
+        'motor': engine,
+        'tamano': size,
+        'filas_usuario': user_rows,
+        'etapas_s': {stage: round(seconds, 4) for stage, seconds in timer.stages.items()},
+        'total_s': round(total, 4),
+        'filas_por_s': round(user_rows / total, 1) if total > 0 else None,
+        'error': error,
+    }
+
+
+def compare_with_base(results, base_file, tolerance):
+    """Lista los motores y etapas que tardaron más que en la corrida base (más allá de la tolerancia)."""
+    with open(base_file, encoding='utf-8') as f:
+        base = {(r['motor'], r['tamano']): r for r in json.load(f)['resultados']}
+
+    regressions = []
+    for result in results:
+        previous = base.get((result['motor'], result['tamano']))
+        if previous is None or result['error'] or previous['error']:
+            continue
+        timings = [('total', result['total_s'], previous['total_s'])]
+        timings += [(stage, seconds, previous['etapas_s'].get(stage))
+                    for stage, seconds in result['etapas_s'].items()]
+        for stage, seconds, before in timings:
+            if before and seconds > before * (1 + tolerance) and seconds - before > MIN_REGRESSION_S:
+                regressions.append(f"{result['motor']} {result['tamano']} {stage}: "
+                                   f"{before:.3f} s -> {seconds:.3f} s (+{(seconds / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los motores de conciliación")
+    parser.add_argument('--tamanos', default=','.join(TAMANOS), help="Tamaños separados por coma (%(default)s)")
+    parser.add_argument('--motores', default=','.join(MOTORES), help="Motores separados por coma (%(default)s)")
+    parser.add_argument('--formato', default='xlsx', choices=['xlsx', 'csv', 'parquet'])
+    parser.add_argument('--datos', default='datos_benchmark', help="Carpeta de los datos sintéticos")
+    parser.add_argument('--salida', default='resultados_benchmark.json')
+    parser.add_argument('--base', help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help="Aumento de tiempo tolerado contra la base (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.tamanos.split(',')]
+    engines = [engine.strip() for engine in args.motores.split(',')]
+    for name in engines:
+        if name not in BENCHMARKS:
+            parser.error(f"Motor desconocido: {name} (opciones: {', '.join(MOTORES)})")
+
+    results = []
+    for size in sizes:
+        print(f"Preparando datos {size} ({args.formato})...")
+        user_file, hospital_files = ensure_dataset(args.datos, size, args.formato)
+        hospital_rows = sum(count_rows(path) for path in hospital_files)
+        for engine in engines:
+            output_dir = os.path.join(args.datos, 'salidas', f'{engine}_{size}')
+            result = run_benchmark(engine, size, user_file, hospital_files, output_dir)
+            result['filas_hospital'] = hospital_rows
+            results.append(result)
+            stages = ', '.join(f"{stage} {seconds:.2f} s" for stage, seconds in result['etapas_s'].items())
+            status = f"ERROR {result['error']}" if result['error'] else f"{result['filas_por_s']} filas/s"
+            print(f"  {engine:16} {result['total_s']:8.2f} s  ({stages})  {status}")
+        shutil.rmtree(os.path.join(args.datos, 'salidas'), ignore_errors=True)
+
+    report = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'plataforma': platform.platform(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'lector_excel_configurado': cache_excel.excel_engine(),
+        'workers': WORKERS,
+        'formato': args.formato,
+        'resultados': results,
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en: {args.salida}")
+
+    if args.base:
+        regressions = compare_with_base(results, args.base, args.tolerancia)
+        if regressions:
+            print(f"Regresiones contra {args.base}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"Sin regresiones contra {args.base}")
+    return 1 if any(result['error'] for result in results) else 0
+
+
+if __name__ == "__main__":
+    from multiprocessing import freeze_support
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,443 @@
+import os
+import gzip
+import codecs
+import hashlib
+import pandas as pd
+
+# Carpeta de la caché (se puede cambiar con la variable de entorno GUITA_ZOKO_CACHE_DIR)
+CACHE_DIR = os.environ.get('GUITA_ZOKO_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'guita_zoko'))
+
+# Tamaño máximo de la caché en disco; al superarlo se borran las entradas menos usadas
+CACHE_MAX_BYTES = int(os.environ.get('GUITA_ZOKO_CACHE_MAX_MB', '500')) * 1024 * 1024
+
+# GUITA_ZOKO_NO_CACHE=1 desactiva la caché por completo
+CACHE_ENABLED = os.environ.get('GUITA_ZOKO_NO_CACHE', '') not in ('1', 'true', 'si')
+
+CACHE_EXTENSIONS = ('.parquet', '.pkl')
+
+# Lector de Excel (GUITA_ZOKO_EXCEL_ENGINE): 'auto' usa calamine si está instalado
+# (pip install python-calamine, varias veces más rápido) y si no openpyxl
+EXCEL_ENGINE = os.environ.get('GUITA_ZOKO_EXCEL_ENGINE', 'auto').strip().lower()
+
+# Además de Excel se aceptan CSV (también comprimidos) y Parquet
+CSV_EXTENSIONS = ('.csv', '.csv.gz')
+PARQUET_EXTENSIONS = ('.parquet',)
+
+# Los .xlsx y .csv más grandes que esto se leen en streaming, por lotes de filas (GUITA_ZOKO_STREAM_MB)
+STREAM_MIN_BYTES = int(os.environ.get('GUITA_ZOKO_STREAM_MB', '25')) * 1024 * 1024
+
+# Filas por lote en la lectura en streaming
+STREAM_BATCH_ROWS = 50000
+
+# Lector que leyó realmente cada archivo en este proceso (ruta absoluta -> lector)
+_readers_used = {}
+
+
+def excel_engine():
+    """Nombre del lector de Excel que se va a usar: 'calamine' u 'openpyxl'."""
+    if EXCEL_ENGINE in ('auto', 'calamine'):
+        try:
+            import python_calamine  # noqa: F401
+            return 'calamine'
+        except ImportError:
+            pass
+    return 'openpyxl'
+
+
+def _record_reader(path, reader):
+    _readers_used[os.path.abspath(path)] = reader
+
+
+def reader_used(path):
+    """Lector con el que se leyó por última vez el archivo en este proceso (None si no se leyó).
+
+    'calamine', 'openpyxl' o 'xlrd' para Excel ('openpyxl (calamine falló)' si hubo que
+    reintentar), 'csv', 'parquet', o 'caché' si salió de la caché en disco. A diferencia de
+    excel_engine(), que es el lector configurado, este es el que se usó de verdad.
+    """
+    return _readers_used.get(os.path.abspath(path))
+
+
+def describe_readers(readers):
+    """Resume una lista de lectores usados: 'calamine (3 archivos), openpyxl (1 archivo)'."""
+    counts = {}
+    for reader in readers:
+        if reader:
+            counts[reader] = counts.get(reader, 0) + 1
+    return ', '.join(f"{reader} ({n} archivo{'' if n == 1 else 's'})" for reader, n in counts.items()) or 'ninguno'
+
+
+def _read_excel(path, **options):
+    """pd.read_excel con el lector configurado; si calamine no puede con el archivo, usa el de pandas.
+
+    Deja registrado el lector que se usó (ver reader_used).
+    """
+    calamine_failed = False
+    if 'engine' not in options and excel_engine() == 'calamine':
+        try:
+            df = pd.read_excel(path, engine='calamine', **options)
+            _record_reader(path, 'calamine')
+            return df
+        except Exception:
+            calamine_failed = True
+    df = pd.read_excel(path, **options)
+    engine = options.get('engine') or ('xlrd' if str(path).lower().endswith('.xls') else 'openpyxl')
+    _record_reader(path, f"{engine} (calamine falló)" if calamine_failed else engine)
+    return df
+
+
+def file_format(path):
+    """Formato del archivo según su extensión: 'excel', 'csv' o 'parquet'."""
+    name = str(path).lower()
+    if name.endswith(CSV_EXTENSIONS):
+        return 'csv'
+    if name.endswith(PARQUET_EXTENSIONS):
+        return 'parquet'
+    return 'excel'
+
+
+# Líneas no vacías del comienzo de un CSV que se miran para detectar el separador
+CSV_SNIFF_LINES = 50
+
+
+def _detect_separator(lines):
+    """Separador más consistente entre las líneas dadas.
+
+    Para cada candidato se busca la cantidad de apariciones por línea más repetida (sin
+    contar las líneas donde no aparece) y gana el que la repite en más líneas; así un
+    título arriba de la tabla o una coma decimal en los datos no cambian el resultado.
+    """
+    best_sep, best_score = ',', (0, 0)
+    for sep in [';', ',', '\t', '|']:
+        counts = [line.count(sep) for line in lines if line.count(sep)]
+        if not counts:
+            continue
+        mode = max(set(counts), key=lambda n: (counts.count(n), n))
+        score = (counts.count(mode), mode)
+        if score > best_score:
+            best_sep, best_score = sep, score
+    return best_sep
+
+
+def _csv_options(path):
+    """Separador y codificación de un CSV, detectados con el comienzo del archivo."""
+    opener = gzip.open if str(path).lower().endswith('.gz') else open
+    block_size = 64 * 1024
+    with opener(path, 'rb') as f:
+        data = f.read(block_size)
+
+    # Los sistemas de facturación suelen exportar en latin-1; si no es UTF-8 válido se usa esa.
+    # Solo se mira el comienzo: si más abajo aparece un byte que no es UTF-8, la lectura
+    # reintenta con latin-1 (ver _read_csv)
+    try:
+        text = codecs.getincrementaldecoder('utf-8-sig')().decode(data, final=False)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        text = data.decode('latin-1')
+        encoding = 'latin-1'
+
+    lines = text.splitlines()
+    # La última línea del bloque puede estar cortada
+    if len(data) == block_size and len(lines) > 1:
+        lines = lines[:-1]
+    sep = _detect_separator([line for line in lines if line.strip()][:CSV_SNIFF_LINES])
+
+    # Ancho máximo de las primeras filas (para leer sin encabezado archivos con títulos arriba)
+    width = max((line.count(sep) + 1 for line in lines[:100]), default=1)
+    return {'sep': sep, 'encoding': encoding}, width
+
+
+def csv_separator(path):
+    """Separador de columnas detectado en un CSV (';' en las exportaciones con coma decimal)."""
+    return _csv_options(path)[0]['sep']
+
+
+def _read_csv(path, **options):
+    """pd.read_csv con las mismas opciones que se usan con read_excel (usecols, dtype, nrows, header)."""
+    options.pop('engine', None)
+    csv_options, width = _csv_options(path)
+    if options.get('header', 0) is None and 'names' not in options:
+        options['names'] = list(range(width))
+    try:
+        df = pd.read_csv(path, **csv_options, **options)
+    except UnicodeDecodeError:
+        if csv_options['encoding'] == 'latin-1':
+            raise
+        df = pd.read_csv(path, **dict(csv_options, encoding='latin-1'), **options)
+    _record_reader(path, 'csv')
+    return df
+
+
+def _read_parquet(path, usecols=None, dtype=None, nrows=None, header=0, **options):
+    """Lee un Parquet pidiendo solo las columnas necesarias (lectura columnar)."""
+    if nrows == 0:
+        try:
+            import pyarrow.parquet as pq
+            df = pd.DataFrame(columns=pq.read_schema(path).names)
+        except ImportError:
+            df = pd.read_parquet(path).head(0)
+    else:
+        df = pd.read_parquet(path, columns=list(usecols) if usecols is not None else None)
+        if nrows is not None:
+            df = df.head(nrows)
+
+    if dtype is not None:
+        df = df.astype(dtype)
+
+    # Sin encabezado: los nombres de columna pasan a ser la primera fila, como en una planilla
+    if header is None:
+        df = pd.DataFrame([list(df.columns)] + df.astype(object).values.tolist())
+    _record_reader(path, 'parquet')
+    return df
+
+
+def _cache_prefix(path, options):
+    """Identifica un archivo de origen + opciones de lectura (sin importar su versión)."""
+    key = f"{os.path.abspath(path)}|{sorted(options.items())!r}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def _cache_stamp(path):
+    """Identifica la versión del archivo de origen por tamaño y fecha de modificación."""
+    stat = os.stat(path)
+    return hashlib.sha1(f"{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')).hexdigest()[:12]
+
+
+def _cache_entries(prefix=None):
+    """Lista las entradas de la caché (opcionalmente solo las de un prefijo)."""
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    return [os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR)
+            if name.endswith(CACHE_EXTENSIONS) and (prefix is None or name.startswith(prefix + '_'))]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _write_entry(write, final_path):
+    """Escribe una entrada en un archivo temporal y la mueve a su lugar de una sola vez.
+
+    Así otro proceso (por ejemplo un worker del pool leyendo el mismo archivo) nunca
+    encuentra una entrada a medio escribir.
+    """
+    temp_path = f"{final_path}.{os.getpid()}.tmp"
+    try:
+        write(temp_path)
+        os.replace(temp_path, final_path)
+    finally:
+        _remove(temp_path)
+    return final_path
+
+
+def _parquet_round_trip(df, path):
+    """Escribe df en Parquet y confirma que al leerlo vuelve igual (mismos tipos y valores)."""
+    df.to_parquet(path)
+    if not pd.read_parquet(path).equals(df):
+        # Por ejemplo una columna object con enteros y vacíos: Parquet la guarda como int64
+        # con nulos y vuelve como float64, y entonces 123 pasa a ser '123.0' con astype(str)
+        raise ValueError("el DataFrame no vuelve igual desde Parquet")
+
+
+def _store(df, base):
+    """Guarda el DataFrame en Parquet si vuelve idéntico al leerlo; si no (sin pyarrow, tipos mixtos) usa pickle.
+
+    La lectura desde la caché tiene que dar exactamente lo mismo que leer el archivo de origen.
+    """
+    try:
+        return _write_entry(lambda path: _parquet_round_trip(df, path), base + '.parquet')
+    except Exception:
+        _remove(base + '.parquet')
+        return _write_entry(df.to_pickle, base + '.pkl')
+
+
+def evict_cache(max_bytes=None):
+    """Borra las entradas menos usadas hasta que la caché entre en max_bytes."""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for entry in _cache_entries():
+        try:
+            stat = os.stat(entry)
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(entry)
+        total -= size
+
+
+def clear_cache():
+    """Borra todas las entradas de la caché."""
+    for entry in _cache_entries():
+        _remove(entry)
+
+
+def read_excel_cached(path, **options):
+    """pd.read_excel con caché persistente en disco, usando el lector de excel_engine().
+
+    También acepta .csv, .csv.gz y .parquet con las mismas opciones (usecols, dtype, nrows,
+    header); los Parquet se leen directo, solo con las columnas pedidas y sin caché.
+
+    La entrada se identifica por ruta, opciones de lectura, tamaño y fecha de modificación
+    del archivo, así que cualquier cambio en el Excel la invalida. Si el archivo ya fue leído,
+    se carga la versión columnar guardada y no se vuelve a parsear el Excel.
+    """
+    fmt = file_format(path)
+    if fmt == 'parquet':
+        return _read_parquet(path, **options)
+
+    reader = _read_csv if fmt == 'csv' else _read_excel
+    if not CACHE_ENABLED:
+        return reader(path, **options)
+
+    # El lector forma parte de la clave: calamine y openpyxl no siempre dan los mismos tipos
+    prefix = _cache_prefix(path, dict(options, engine=options.get('engine', excel_engine())))
+    base = os.path.join(CACHE_DIR, f"{prefix}_{_cache_stamp(path)}")
+
+    for entry in (base + '.parquet', base + '.pkl'):
+        if os.path.exists(entry):
+            try:
+                df = pd.read_parquet(entry) if entry.endswith('.parquet') else pd.read_pickle(entry)
+                os.utime(entry)  # Marcar como usada recientemente
+                _record_reader(path, 'caché')
+                return df
+            except Exception:
+                _remove(entry)
+
+    df = reader(path, **options)
+
+    # Guardar en caché; un fallo aquí nunca debe impedir la lectura
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Versiones anteriores del mismo archivo ya no sirven
+        for entry in _cache_entries(prefix):
+            _remove(entry)
+        _store(df, base)
+        evict_cache()
+    except Exception:
+        pass
+
+    return df
+
+
+def read_excel_header(path, **options):
+    """Lee solo la fila de encabezados (DataFrame vacío con las columnas del archivo).
+
+    Sirve para detectar las columnas de HC, nombre, fecha, etc. antes de cargar el archivo
+    completo, y así pedir después solo esas columnas con usecols/dtype.
+    """
+    return read_excel_cached(path, nrows=0, **options)
+
+
+def should_stream(path):
+    """Indica si conviene leer el archivo en streaming en vez de cargarlo entero."""
+    try:
+        return (path.lower().endswith(('.xlsx', '.xlsm') + CSV_EXTENSIONS)
+                and os.path.getsize(path) >= STREAM_MIN_BYTES)
+    except OSError:
+        return False
+
+
+def _convert_cell(cell):
+    """Convierte una celda igual que pd.read_excel con openpyxl."""
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return float('nan')
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+def iter_excel_batches(path, usecols=None, dtype=None, batch_size=None):
+    """Lee la primera hoja fila por fila (openpyxl en modo solo lectura) y genera DataFrames por lotes.
+
+    Nunca arma la hoja completa en memoria: cada lote tiene a lo sumo batch_size filas y solo
+    las columnas de usecols (nombres del encabezado). El índice de cada lote es la fila de
+    origen con la misma numeración que pd.read_excel (fila de la hoja = índice + 2), y la
+    conversión de celdas y vacíos también es la misma. Con dtype=object, concatenar los lotes
+    da el mismo DataFrame que read_excel_cached(path, usecols=usecols, dtype=object); sin
+    dtype, cada lote infiere sus tipos por separado.
+    No usa la caché: está pensado para archivos demasiado grandes para guardarlos enteros.
+    Los CSV se leen por bloques con pd.read_csv, con el mismo índice por fila.
+    """
+    batch_size = batch_size or STREAM_BATCH_ROWS
+
+    if file_format(path) == 'csv':
+        csv_options, _ = _csv_options(path)
+        _record_reader(path, 'csv')
+        yielded = 0
+        try:
+            with pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=batch_size, **csv_options) as reader:
+                for chunk in reader:
+                    yield chunk
+                    yielded += len(chunk)
+        except UnicodeDecodeError:
+            if csv_options['encoding'] == 'latin-1':
+                raise
+            # Byte no UTF-8 más abajo del comienzo: releer en latin-1 desde la primera fila no entregada
+            csv_options['encoding'] = 'latin-1'
+            with pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=batch_size, **csv_options) as reader:
+                for chunk in reader:
+                    chunk = chunk[chunk.index >= yielded]
+                    if len(chunk):
+                        yield chunk
+        return
+
+    from openpyxl import load_workbook
+    from pandas.io.parsers import TextParser
+
+    header = list(read_excel_header(path).columns)
+    positions = [header.index(col) for col in usecols] if usecols is not None else list(range(len(header)))
+    names = [header[pos] for pos in positions]
+
+    # Primera fila vacía: no hay nombres de columnas, se lee de la forma habitual
+    if not names:
+        yield read_excel_cached(path, usecols=usecols, dtype=dtype)
+        return
+
+    def make_batch(rows, first_index):
+        df = TextParser(rows, header=None, names=names, dtype=dtype, skip_blank_lines=False).read()
+        df.index = pd.RangeIndex(first_index, first_index + len(rows))
+        return df
+
+    book = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    _record_reader(path, 'openpyxl')
+    try:
+        sheet = book.worksheets[0]
+        sheet.reset_dimensions()
+
+        batch, first_index, next_index = [], 0, 0
+        pending_blank = []  # Filas vacías: pd.read_excel descarta las del final de la hoja
+        for row in sheet.iter_rows(min_row=2):
+            converted = [_convert_cell(row[pos]) if pos < len(row) else "" for pos in positions]
+            if all(cell.value in (None, '') for cell in row):
+                pending_blank.append(converted)
+                continue
+
+            if not batch:
+                first_index = next_index
+            batch.extend(pending_blank)
+            batch.append(converted)
+            next_index += len(pending_blank) + 1
+            pending_blank = []
+
+            if len(batch) >= batch_size:
+                yield make_batch(batch, first_index)
+                batch = []
+
+        if batch:
+            yield make_batch(batch, first_index)
+    finally:
+        book.close()
@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Cantidad de procesos para cargar archivos (GUITA_ZOKO_WORKERS; 0 o vacío = uno por núcleo)
+WORKERS = int(os.environ.get('GUITA_ZOKO_WORKERS', '0') or 0) or os.cpu_count() or 1
+
+
+def _run(func, path, args):
+    try:
+        return func(path, *args), None
+    except Exception as e:
+        return None, e
+
+
+def _map_sequential(func, paths, args, on_done):
+    results = []
+    for i, path in enumerate(paths):
+        results.append(_run(func, path, args))
+        if on_done:
+            on_done(i + 1, len(paths))
+    return results
+
+
+def map_files(func, paths, *args, max_workers=None, on_done=None):
+    """Aplica func(path, *args) a cada archivo en un pool de procesos, un archivo por worker.
+
+    Devuelve una lista de (resultado, error) en el mismo orden que paths; error es la
+    excepción que levantó ese archivo o None. func tiene que estar definida a nivel de
+    módulo para poder enviarla a los procesos. on_done(terminados, total) se llama en el
+    proceso principal cada vez que termina un archivo.
+
+    Con un solo archivo o un solo worker se ejecuta en el mismo proceso. Si el pool falla
+    (no se puede crear en un ejecutable congelado, o un proceso murió, por ejemplo por
+    falta de memoria) los archivos que no terminaron se cargan en el mismo proceso; los
+    que ya terminaron no se vuelven a leer.
+    """
+    paths = list(paths)
+    workers = min(max_workers or WORKERS, len(paths))
+    if workers <= 1:
+        return _map_sequential(func, paths, args, on_done)
+
+    results = [None] * len(paths)
+    done = 0
+    futures = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run, func, path, args) for path in paths]
+            for i, future in enumerate(futures):
+                results[i] = future.result()
+                done += 1
+                if on_done:
+                    on_done(done, len(paths))
+            return results
+    except Exception:
+        pass
+
+    # Rescatar los que terminaron bien después del que falló
+    for i, future in enumerate(futures):
+        if results[i] is None and future.done() and not future.cancelled() and future.exception() is None:
+            results[i] = future.result()
+            done += 1
+            if on_done:
+                on_done(done, len(paths))
+
+    for i, path in enumerate(paths):
+        if results[i] is None:
+            results[i] = _run(func, path, args)
+            done += 1
+            if on_done:
+                on_done(done, len(paths))
+    return results
+
+
+def iter_files(func, paths, *args, max_workers=None, cancel_event=None):
+    """Como map_files, pero genera (índice, resultado, error) a medida que termina cada archivo.
+
+    Si cancel_event (un threading.Event) se activa, los archivos que todavía no empezaron se
+    cancelan y no se generan; los que ya se están procesando terminan normalmente.
+    """
+    paths = list(paths)
+    workers = min(max_workers or WORKERS, len(paths))
+    if workers <= 1:
+        for i, path in enumerate(paths):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            yield (i,) + _run(func, path, args)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(_run, func, path, args): i for i, path in enumerate(paths)}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not future.cancelled():
+                    yield (futures[future],) + future.result()
+            if cancel_event is not None and cancel_event.is_set():
+                for future in pending:
+                    future.cancel()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -3,6 +3,7 @@ from tkinter import ttk, filedialog, messagebox, scrolledtext
 import pandas as pd
 import numpy as np
 import os
+from cache_excel import read_excel_cached, reader_used
 
 class FileAnalyzerApp:
     def __init__(self, root):
@@ -69,8 +70,9 @@ class FileAnalyzerApp:
             output += '='*80 + "\n"
             
             # Leer archivo
-            df = pd.read_excel(file_path)
+            df = read_excel_cached(file_path)
             
+            output += f"📖 Lector de Excel usado: {reader_used(file_path)}\n"
             output += f"📊 Dimensiones: {df.shape[0]} filas x {df.shape[1]} columnas\n"
             
             output += f"\n📋 Columnas encontradas:\n"
@@ -139,7 +141,7 @@ class FileAnalyzerApp:
     def analyze_user_file(self):
         file_path = filedialog.askopenfilename(
             title="Selecciona tu archivo de registro (usuario)",
-            filetypes=[("Archivos Excel", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos Excel, CSV o Parquet", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         
         if file_path:
@@ -155,7 +157,7 @@ class FileAnalyzerApp:
     def analyze_hospital_files(self):
         file_paths = filedialog.askopenfilenames(
             title="Selecciona archivos del hospital",
-            filetypes=[("Archivos Excel", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos Excel, CSV o Parquet", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         
         if file_paths:
@@ -175,7 +177,7 @@ class FileAnalyzerApp:
         # Archivo de usuario
         user_file = filedialog.askopenfilename(
             title="Selecciona tu archivo de registro (usuario)",
-            filetypes=[("Archivos Excel", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos Excel, CSV o Parquet", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         
         if not user_file:
@@ -184,7 +186,7 @@ class FileAnalyzerApp:
         # Archivos del hospital
         hospital_files = filedialog.askopenfilenames(
             title="Selecciona archivos del hospital",
-            filetypes=[("Archivos Excel", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos Excel, CSV o Parquet", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         
         if not hospital_files:
@@ -240,7 +242,7 @@ class FileAnalyzerApp:
         # Seleccionar archivos
         user_file = filedialog.askopenfilename(
             title="Selecciona tu archivo de registro (usuario)",
-            filetypes=[("Archivos Excel", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos Excel, CSV o Parquet", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         
         if not user_file:
@@ -248,7 +250,7 @@ class FileAnalyzerApp:
         
         hospital_files = filedialog.askopenfilenames(
             title="Selecciona archivos del hospital",
-            filetypes=[("Archivos Excel", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos Excel, CSV o Parquet", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         
         if not hospital_files:
@@ -1447,11 +1447,438 @@ if __name__ == "__main__":
 import pandas as pd
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from datetime import datetime
+from datetime import datetime, date
 import os
 import re
+from cache_excel import read_excel_cached, read_excel_header, excel_engine, reader_used, describe_readers
+from carga_paralela import map_files
+from multiprocessing import freeze_support
 
-class PatientControlApp:
+class PatientMatcher:
+    """Carga, normalización y cruce de archivos del hospital y del usuario, sin interfaz
+
+    PatientControlApp la usa para procesar; el pool de carga y el benchmark la usan sola.
+    """
+    
+    def normalize_text(self, text):
+        """Normaliza texto para comparación insensible a mayúsculas/minúsculas"""
+        if pd.isna(text) or text is None:
+            return ""
+        return str(text).strip().upper()
+    
+    def normalize_date_column(self, values):
+        """Normaliza una columna completa de fechas a datetime64 (sin hora) una sola vez
+        
+        - Celdas datetime/date se convierten directamente
+        - Números se interpretan como fechas seriales de Excel (entre 1950 y 2099)
+        - Textos: se infiere un formato por columna a partir de una muestra; ante valores
+          ambiguos (ej. 03/04/2024) gana el formato día/mes. Los textos que no encajan
+          en el formato inferido prueban los demás formatos
+        Las celdas no reconocidas quedan como NaT.
+        """
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values.dt.normalize()
+        
+        result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+        
+        # Fechas seriales de Excel
+        if pd.api.types.is_numeric_dtype(values):
+            is_number = values.notna()
+        else:
+            is_number = values.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)
+                                   and not pd.isna(v)).astype(bool)
+        serials = pd.to_numeric(values[is_number])
+        serials = serials[(serials >= 18264) & (serials <= 73050)]
+        result.loc[serials.index] = pd.to_datetime(serials, unit='D', origin='1899-12-30').dt.normalize()
+        
+        if pd.api.types.is_numeric_dtype(values):
+            return result
+        
+        # Celdas que ya son fechas
+        is_date = values.map(lambda v: isinstance(v, (datetime, date))).astype(bool)
+        if is_date.any():
+            parsed = pd.to_datetime(values[is_date].astype(object), errors='coerce')
+            result.loc[parsed.index] = parsed.dt.normalize()
+        
+        # Textos: inferir un formato por columna a partir de una muestra
+        is_text = values.map(lambda v: isinstance(v, str)).astype(bool)
+        text = values[is_text].astype(str).str.strip()
+        text = text[text != '']
+        if text.empty:
+            return result
+        
+        formats = ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%y', '%m/%d/%Y', '%m-%d-%Y']
+        sample = text.drop_duplicates().head(200)
+        best_format = max(formats, key=lambda fmt: pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum())
+        
+        pending = text
+        for fmt in [best_format] + [fmt for fmt in formats if fmt != best_format]:
+            parsed = pd.to_datetime(pending, format=fmt, errors='coerce')
+            result.loc[parsed.index[parsed.notna()]] = parsed[parsed.notna()]
+            pending = pending[parsed.isna()]
+            if pending.empty:
+                break
+        
+        return result
+    
+    def date_list(self, date_values, n_rows):
+        """Convierte una columna normalizada de fechas en lista (None = sin fecha)"""
+        if date_values is None:
+            return [None] * n_rows
+        return [None if pd.isna(value) else value for value in date_values.tolist()]
+    
+    def find_hc_column(self, df):
+        """Encuentra la columna de historia clínica"""
+        hc_patterns = ['hc', 'historia', 'hist', 'h.c', 'historia clinica', 'historia clínica']
+        
+        for col in df.columns:
+            col_name = str(col).lower().strip()
+            for pattern in hc_patterns:
+                if pattern in col_name:
+                    return col
+        return None
+    
+    def find_patient_column(self, df):
+        """Encuentra la columna de paciente/nombre"""
+        patient_patterns = ['paciente', 'nombre', 'apellido', 'patient', 'name']
+        
+        for col in df.columns:
+            col_name = str(col).lower().strip()
+            for pattern in patient_patterns:
+                if pattern in col_name:
+                    return col
+        return None
+    
+    def find_date_column(self, df):
+        """Encuentra la columna de fecha"""
+        date_patterns = ['fecha', 'date', 'dia', 'day']
+        
+        for col in df.columns:
+            col_name = str(col).lower().strip()
+            for pattern in date_patterns:
+                if pattern in col_name:
+                    return col
+        return None
+    
+    def detect_header_row(self, raw, max_rows=10):
+        """Busca la fila de encabezados entre las primeras filas de una hoja leída sin encabezado
+        
+        Cada fila se puntúa según cuántas columnas clave (HC, paciente, fecha) reconoce;
+        gana la de mayor puntaje y, ante empate, la primera. Sin coincidencias se usa la fila 0.
+        """
+        best_row, best_score = 0, 0
+        for pos in range(min(max_rows, len(raw))):
+            names = pd.DataFrame(columns=[str(value).strip() for value in raw.iloc[pos] if not pd.isna(value)])
+            score = sum(finder(names) is not None
+                        for finder in (self.find_hc_column, self.find_patient_column, self.find_date_column))
+            if score > best_score:
+                best_row, best_score = pos, score
+        return best_row
+    
+    def load_with_detected_header(self, filepath, key_columns_only=False):
+        """Lee la hoja una sola vez sin encabezado y la recorta desde la fila de encabezados detectada
+        
+        Devuelve el DataFrame y la lista de todas las columnas de la hoja.
+        """
+        raw = read_excel_cached(filepath, header=None, dtype=object)
+        if raw.empty:
+            return raw, []
+        
+        header_row = self.detect_header_row(raw)
+        df = raw.iloc[header_row + 1:].reset_index(drop=True)
+        df.columns = [None if pd.isna(value) else value for value in raw.iloc[header_row]]
+        
+        # Posiciones de las columnas clave (los nombres pueden repetirse o faltar)
+        names = pd.DataFrame(columns=[str(col).strip() if col is not None else f'Col_{i}'
+                                      for i, col in enumerate(df.columns)])
+        hc_col = self.find_hc_column(names)
+        patient_col = self.find_patient_column(names)
+        date_col = self.find_date_column(names)
+        positions = {col: list(names.columns).index(col) for col in (hc_col, patient_col, date_col) if col is not None}
+        
+        # Todo se leyó como texto/objeto: volver a inferir tipos, salvo HC y paciente
+        typed = df.infer_objects()
+        for col in (hc_col, patient_col):
+            if col is not None:
+                typed.isetitem(positions[col], df.iloc[:, positions[col]])
+        
+        if key_columns_only and positions:
+            typed = typed.iloc[:, sorted(set(positions.values()))]
+        
+        return typed, list(names.columns)
+    
+    def load_excel_file(self, filepath, key_columns_only=False):
+        """Carga un archivo Excel y retorna DataFrame con columnas identificadas
+        
+        Primero lee solo el encabezado para detectar las columnas de HC, paciente y fecha.
+        Con key_columns_only=True carga únicamente esas columnas (archivos del hospital).
+        HC y paciente se leen sin conversión de tipos, igual en hospital y usuario.
+        Si la primera fila no tiene encabezados reconocibles (títulos arriba de la tabla),
+        la hoja se lee una sola vez sin encabezado y se busca la fila de encabezados en memoria.
+        """
+        try:
+            # Intentar leer el archivo con diferentes configuraciones
+            df = None
+            sheet_columns = None
+            
+            # Intentar lectura estándar: encabezado primero, después solo lo necesario
+            try:
+                header = read_excel_header(filepath)
+                # Los 'Unnamed: n' los inventa pandas para celdas vacías: no cuentan como encabezado
+                named_header = header.loc[:, [not str(col).startswith('Unnamed:') for col in header.columns]]
+                hc_col = self.find_hc_column(named_header)
+                patient_col = self.find_patient_column(named_header)
+                date_col = self.find_date_column(named_header)
+                
+                if any(col is not None for col in (hc_col, patient_col, date_col)):
+                    key_columns = list(dict.fromkeys(col for col in (hc_col, patient_col, date_col) if col is not None))
+                    text_dtypes = {col: object for col in (hc_col, patient_col) if col is not None}
+                    
+                    df = read_excel_cached(filepath,
+                                           usecols=key_columns if key_columns_only else None,
+                                           dtype=text_dtypes)
+                    sheet_columns = [str(col).strip() for col in header.columns]
+            except:
+                pass
+            
+            # Si no se reconoce el encabezado: una sola lectura sin encabezado y detección en memoria
+            if df is None or df.empty:
+                try:
+                    df, sheet_columns = self.load_with_detected_header(filepath, key_columns_only)
+                except:
+                    df = None
+            
+            if df is None or df.empty:
+                return None, "No se pudo leer el archivo o está vacío"
+            
+            # Filas de datos de la hoja (bajo el encabezado), antes de descartar las vacías:
+            # con key_columns_only el DataFrame solo dice cuántas tienen HC, paciente o fecha
+            sheet_rows = len(df)
+            
+            # Limpiar DataFrame
+            # Eliminar filas completamente vacías; índice 0..n-1 para que date_values
+            # se pueda buscar por fila aunque el archivo traiga etiquetas repetidas
+            df = df.dropna(how='all').reset_index(drop=True)
+            
+            # Limpiar nombres de columnas
+            df.columns = [str(col).strip() if col is not None else f'Col_{i}' 
+                         for i, col in enumerate(df.columns)]
+            
+            # Identificar columnas importantes
+            hc_col = self.find_hc_column(df)
+            patient_col = self.find_patient_column(df)
+            date_col = self.find_date_column(df)
+            
+            # Normalizar las fechas de toda la columna una sola vez
+            date_values = self.normalize_date_column(df[date_col]) if date_col else None
+            
+            return {
+                'dataframe': df,
+                'hc_column': hc_col,
+                'patient_column': patient_col,
+                'date_column': date_col,
+                'date_values': date_values,
+                'sheet_columns': sheet_columns or list(df.columns),
+                'sheet_rows': sheet_rows,
+                'key_columns_only': key_columns_only,
+                'filename': os.path.basename(filepath),
+                'excel_reader': reader_used(filepath)
+            }, None
+            
+        except Exception as e:
+            return None, f"Error al leer {filepath}: {str(e)}"
+    
+    def build_hospital_index(self, hospital_data_list):
+        """Normaliza una sola vez los archivos del HOSPITAL y arma los índices de búsqueda
+        
+        - 'hc': HC -> conjunto de fechas
+        - 'patient': paciente -> conjunto de fechas (todas las filas)
+        - 'patient_no_hc': paciente -> conjunto de fechas (solo filas del hospital sin HC)
+        Una fila sin fecha se guarda como None dentro del conjunto.
+        """
+        index = {'hc': {}, 'patient': {}, 'patient_no_hc': {}}
+        
+        for hospital_info in hospital_data_list:
+            hospital_df = hospital_info['dataframe']
+            n_rows = len(hospital_df)
+            
+            hc_col = hospital_info['hc_column']
+            patient_col = hospital_info['patient_column']
+            
+            hcs = (hospital_df[hc_col].map(self.normalize_text).tolist()
+                   if hc_col and hc_col in hospital_df.columns else [""] * n_rows)
+            patients = (hospital_df[patient_col].map(self.normalize_text).tolist()
+                        if patient_col and patient_col in hospital_df.columns else [""] * n_rows)
+            dates = self.date_list(hospital_info['date_values'], n_rows)
+            
+            for hospital_hc, hospital_patient, hospital_date in zip(hcs, patients, dates):
+                # Skip filas vacías del hospital
+                if not hospital_hc and not hospital_patient:
+                    continue
+                
+                if hospital_hc:
+                    index['hc'].setdefault(hospital_hc, set()).add(hospital_date)
+                
+                if hospital_patient:
+                    index['patient'].setdefault(hospital_patient, set()).add(hospital_date)
+                    if not hospital_hc:
+                        index['patient_no_hc'].setdefault(hospital_patient, set()).add(hospital_date)
+        
+        return index
+    
+    def dates_match(self, user_date, hospital_dates):
+        """Verifica la fecha contra un conjunto de fechas del hospital (None = sin fecha)"""
+        if hospital_dates is None:
+            return False
+        
+        # Al menos una no tiene fecha (PAGADO)
+        if not user_date or None in hospital_dates:
+            return True
+        
+        return user_date in hospital_dates
+    
+    def search_user_patient_in_hospital_files(self, user_row, user_info, hospital_index):
+        """Busca un paciente del USUARIO en el índice de los archivos del HOSPITAL"""
+        
+        user_hc = None
+        user_patient = None
+        user_date = None
+        
+        # Obtener datos del USUARIO
+        if user_info['hc_column'] and user_info['hc_column'] in user_row:
+            user_hc = self.normalize_text(user_row[user_info['hc_column']])
+        
+        if user_info['patient_column'] and user_info['patient_column'] in user_row:
+            user_patient = self.normalize_text(user_row[user_info['patient_column']])
+        
+        if user_info['date_values'] is not None:
+            user_date = user_info['date_values'].get(user_row.name)
+            if pd.isna(user_date):
+                user_date = None
+        
+        # Skip si no hay datos suficientes para comparar
+        if (not user_hc or user_hc == "") and (not user_patient or user_patient == ""):
+            return True  # No se puede verificar, asumir que existe (pagado)
+        
+        if user_hc:
+            # Caso 1: HC coincide con alguna fila del hospital que tiene HC
+            if self.dates_match(user_date, hospital_index['hc'].get(user_hc)):
+                return True
+            
+            # Caso 2: por nombre, solo contra filas del hospital sin HC
+            if user_patient and self.dates_match(user_date, hospital_index['patient_no_hc'].get(user_patient)):
+                return True
+        
+        # Caso 2: el usuario no tiene HC, comparar por nombre contra todo el hospital
+        elif self.dates_match(user_date, hospital_index['patient'].get(user_patient)):
+            return True
+        
+        return False  # No encontrado en hospital (NO PAGADO)
+    
+    def find_missing_patients(self, user_data_list, hospital_index, on_progress=None):
+        """Filas del USUARIO que no aparecen en el índice del HOSPITAL (no pagadas)
+        
+        on_progress(filas procesadas, total) se llama por cada fila del usuario.
+        """
+        missing_patients = []
+        total_rows = sum(len(data['dataframe']) for data in user_data_list)  # Total de filas del USUARIO
+        processed_rows = 0
+        
+        # LÓGICA CORREGIDA: Buscar pacientes del USUARIO en archivos del HOSPITAL
+        for user_info in user_data_list:
+            user_df = user_info['dataframe']
+            
+            for _, user_row in user_df.iterrows():
+                processed_rows += 1
+                if on_progress:
+                    on_progress(processed_rows, total_rows)
+                
+                # Verificar que la fila del USUARIO tenga datos válidos
+                has_valid_data = False
+                for col in user_df.columns:
+                    if not pd.isna(user_row[col]) and str(user_row[col]).strip() != "":
+                        has_valid_data = True
+                        break
+                
+                if not has_valid_data:
+                    continue  # Skip filas completamente vacías
+                
+                # Buscar este paciente del USUARIO en los archivos del HOSPITAL
+                found = self.search_user_patient_in_hospital_files(user_row, user_info, hospital_index)
+                
+                if not found:
+                    # Crear registro del paciente del USUARIO que NO fue encontrado en hospital (no pagado)
+                    missing_record = {}
+                    for col in user_df.columns:
+                        missing_record[col] = user_row[col]
+                    missing_record['Archivo_Origen_Usuario'] = user_info['filename']
+                    missing_patients.append(missing_record)
+        
+        return missing_patients
+    
+    def build_report_dataframe(self, missing_patients):
+        """Arma el reporte con las columnas estándar a partir de las filas del usuario no pagadas"""
+        # Los datos ya vienen del archivo del USUARIO con las columnas correctas
+        # Solo necesitamos mapear a las columnas estándar si es necesario
+        
+        desired_columns = ['Hc', 'Paciente', 'Cobertura', 'Consultorio', 'Estado', 'Fecha']
+        
+        # Crear un nuevo DataFrame con las columnas deseadas
+        report_data = []
+        for patient in missing_patients:
+            # Los datos ya vienen del usuario, solo necesitamos mapearlos si tienen nombres diferentes
+            row_data = {}
+            
+            # Mapear directamente si las columnas ya existen con los nombres correctos
+            for desired_col in desired_columns:
+                row_data[desired_col] = ""
+                
+                # Buscar la columna en los datos originales del usuario
+                for key, value in patient.items():
+                    if key == 'Archivo_Origen_Usuario':
+                        continue
+                        
+                    key_lower = str(key).lower().strip()
+                    
+                    if desired_col == 'Hc':
+                        if any(hc_pattern in key_lower for hc_pattern in ['hc', 'historia', 'hist']):
+                            row_data[desired_col] = value if not pd.isna(value) else ""
+                            break
+                    elif desired_col == 'Paciente':
+                        if any(patient_pattern in key_lower for patient_pattern in ['paciente', 'nombre', 'apellido']):
+                            row_data[desired_col] = value if not pd.isna(value) else ""
+                            break
+                    elif desired_col == 'Cobertura':
+                        if any(cob_pattern in key_lower for cob_pattern in ['cobertura', 'obra', 'social', 'plan', 'seguro']):
+                            row_data[desired_col] = value if not pd.isna(value) else ""
+                            break
+                    elif desired_col == 'Consultorio':
+                        if any(cons_pattern in key_lower for cons_pattern in ['consultorio', 'consulta', 'atencion', 'servicio']):
+                            row_data[desired_col] = value if not pd.isna(value) else ""
+                            break
+                    elif desired_col == 'Estado':
+                        if any(est_pattern in key_lower for est_pattern in ['estado', 'status', 'situacion']):
+                            row_data[desired_col] = value if not pd.isna(value) else ""
+                            break
+                    elif desired_col == 'Fecha':
+                        if any(fecha_pattern in key_lower for fecha_pattern in ['fecha', 'date', 'dia', 'day']):
+                            if not pd.isna(value):
+                                try:
+                                    if isinstance(value, datetime):
+                                        row_data[desired_col] = value.strftime('%d/%m/%Y')
+                                    else:
+                                        row_data[desired_col] = str(value)
+                                except:
+                                    row_data[desired_col] = str(value)
+                            break
+            
+            report_data.append(row_data)
+        
+        # Crear DataFrame con formato estandarizado
+        df_report = pd.DataFrame(report_data, columns=desired_columns)
+        return df_report
+
+class PatientControlApp(PatientMatcher):
     def __init__(self, root):
         self.root = root
         self.root.title("Control de Pacientes - Hospital vs Usuario")
@@ -1461,6 +1888,12 @@ class PatientControlApp:
         self.hospital_files = []
         self.user_files = []
         
+        # Registro de la sesión: (ruta, solo columnas clave) -> archivo ya cargado
+        self.loaded_files = {}
+        
+        # Procesos para cargar archivos en paralelo (None = GUITA_ZOKO_WORKERS o uno por núcleo)
+        self.max_workers = None
+        
         self.setup_ui()
     
     def setup_ui(self):
@@ -1534,7 +1967,7 @@ class PatientControlApp:
     def add_hospital_files(self):
         files = filedialog.askopenfilenames(
             title="Seleccionar archivos del hospital",
-            filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+            filetypes=[("Excel, CSV or Parquet files", "*.xlsx *.xls *.csv *.gz *.parquet"), ("All files", "*.*")]
         )
         for file in files:
             if file not in self.hospital_files:
@@ -1544,7 +1977,7 @@ class PatientControlApp:
     def add_user_files(self):
         files = filedialog.askopenfilenames(
             title="Seleccionar archivos del usuario",
-            filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+            filetypes=[("Excel, CSV or Parquet files", "*.xlsx *.xls *.csv *.gz *.parquet"), ("All files", "*.*")]
         )
         for file in files:
             if file not in self.user_files:
@@ -1552,195 +1985,67 @@ class PatientControlApp:
                 self.user_listbox.insert(tk.END, os.path.basename(file))
     
     def clear_hospital_files(self):
+        self.forget_loaded_files(self.hospital_files)
         self.hospital_files.clear()
         self.hospital_listbox.delete(0, tk.END)
     
     def clear_user_files(self):
+        self.forget_loaded_files(self.user_files)
         self.user_files.clear()
         self.user_listbox.delete(0, tk.END)
     
-    def normalize_text(self, text):
-        """Normaliza texto para comparación insensible a mayúsculas/minúsculas"""
-        if pd.isna(text) or text is None:
-            return ""
-        return str(text).strip().upper()
-    
-    def normalize_date(self, date_value):
-        """Normaliza fechas a formato comparable"""
-        if pd.isna(date_value) or date_value is None:
+    def file_stamp(self, filepath):
+        """Tamaño y fecha de modificación del archivo (para saber si cambió desde que se cargó)"""
+        try:
+            stat = os.stat(filepath)
+            return (stat.st_size, stat.st_mtime_ns)
+        except OSError:
             return None
-        
-        # Si ya es datetime
-        if isinstance(date_value, datetime):
-            return date_value.date()
-        
-        # Si es string, intentar parsearlo
-        if isinstance(date_value, str):
-            date_value = date_value.strip()
-            # Intentar varios formatos comunes
-            formats = ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%y']
-            for fmt in formats:
-                try:
-                    return datetime.strptime(date_value, fmt).date()
-                except ValueError:
-                    continue
-        
-        return None
     
-    def find_hc_column(self, df):
-        """Encuentra la columna de historia clínica"""
-        hc_patterns = ['hc', 'historia', 'hist', 'h.c', 'historia clinica', 'historia clínica']
+    def is_loaded(self, filepath, key_columns_only=False):
+        """Indica si el archivo está en el registro y no cambió en disco desde que se cargó"""
+        entry = self.loaded_files.get((filepath, key_columns_only))
+        return entry is not None and entry['stamp'] == self.file_stamp(filepath)
+    
+    def get_loaded_file(self, filepath, key_columns_only=False):
+        """Devuelve el archivo desde el registro de la sesión; lo carga solo si no está o cambió"""
+        key = (filepath, key_columns_only)
+        if not self.is_loaded(filepath, key_columns_only):
+            stamp = self.file_stamp(filepath)
+            data, error = self.load_excel_file(filepath, key_columns_only)
+            self.loaded_files[key] = {'stamp': stamp, 'data': data, 'error': error}
+        entry = self.loaded_files[key]
+        return entry['data'], entry['error']
+    
+    def load_files_parallel(self, filepaths, key_columns_only=False, label="archivo"):
+        """Carga en un pool de procesos (un archivo por proceso) los que falten en el registro"""
+        pending = [filepath for filepath in filepaths if not self.is_loaded(filepath, key_columns_only)]
+        if not pending:
+            return
         
-        for col in df.columns:
-            col_name = str(col).lower().strip()
-            for pattern in hc_patterns:
-                if pattern in col_name:
-                    return col
-        return None
-    
-    def find_patient_column(self, df):
-        """Encuentra la columna de paciente/nombre"""
-        patient_patterns = ['paciente', 'nombre', 'apellido', 'patient', 'name']
+        def on_done(done, total):
+            self.status_label.config(text=f"Cargando {label} {done}/{total}")
+            self.root.update()
         
-        for col in df.columns:
-            col_name = str(col).lower().strip()
-            for pattern in patient_patterns:
-                if pattern in col_name:
-                    return col
-        return None
-    
-    def find_date_column(self, df):
-        """Encuentra la columna de fecha"""
-        date_patterns = ['fecha', 'date', 'dia', 'day']
+        stamps = {filepath: self.file_stamp(filepath) for filepath in pending}
+        results = map_files(load_excel_file_in_process, pending, key_columns_only,
+                            max_workers=self.max_workers, on_done=on_done)
         
-        for col in df.columns:
-            col_name = str(col).lower().strip()
-            for pattern in date_patterns:
-                if pattern in col_name:
-                    return col
-        return None
+        for filepath, (result, error) in zip(pending, results):
+            data, load_error = result if error is None else (None, f"Error al leer {filepath}: {str(error)}")
+            self.loaded_files[(filepath, key_columns_only)] = {'stamp': stamps[filepath], 'data': data, 'error': load_error}
     
-    def load_excel_file(self, filepath):
-        """Carga un archivo Excel y retorna DataFrame con columnas identificadas"""
-        try:
-            # Intentar leer el archivo con diferentes configuraciones
-            df = None
-            
-            # Intentar lectura estándar
-            try:
-                df = pd.read_excel(filepath)
-            except:
-                pass
-            
-            # Si falla, intentar saltando filas iniciales
-            if df is None or df.empty:
-                for skip_rows in range(1, 5):
-                    try:
-                        df = pd.read_excel(filepath, skiprows=skip_rows)
-                        if not df.empty and len(df.columns) > 2:
-                            break
-                    except:
-                        continue
-            
-            if df is None or df.empty:
-                return None, "No se pudo leer el archivo o está vacío"
-            
-            # Limpiar DataFrame
-            # Eliminar filas completamente vacías
-            df = df.dropna(how='all')
-            
-            # Limpiar nombres de columnas
-            df.columns = [str(col).strip() if col is not None else f'Col_{i}' 
-                         for i, col in enumerate(df.columns)]
-            
-            # Identificar columnas importantes
-            hc_col = self.find_hc_column(df)
-            patient_col = self.find_patient_column(df)
-            date_col = self.find_date_column(df)
-            
-            return {
-                'dataframe': df,
-                'hc_column': hc_col,
-                'patient_column': patient_col,
-                'date_column': date_col,
-                'filename': os.path.basename(filepath)
-            }, None
-            
-        except Exception as e:
-            return None, f"Error al leer {filepath}: {str(e)}"
+    def get_file_info(self, filepath):
+        """Datos para la ventana de información: reutiliza cualquier carga vigente del registro"""
+        for key_columns_only in (False, True):
+            if self.is_loaded(filepath, key_columns_only):
+                return self.get_loaded_file(filepath, key_columns_only)
+        return self.get_loaded_file(filepath)
     
-    def search_user_patient_in_hospital_files(self, user_row, user_info, hospital_data_list):
-        """Busca un paciente del USUARIO en los archivos del HOSPITAL"""
-        
-        user_hc = None
-        user_patient = None
-        user_date = None
-        
-        # Obtener datos del USUARIO
-        if user_info['hc_column'] and user_info['hc_column'] in user_row:
-            user_hc = self.normalize_text(user_row[user_info['hc_column']])
-        
-        if user_info['patient_column'] and user_info['patient_column'] in user_row:
-            user_patient = self.normalize_text(user_row[user_info['patient_column']])
-        
-        if user_info['date_column'] and user_info['date_column'] in user_row:
-            user_date = self.normalize_date(user_row[user_info['date_column']])
-        
-        # Skip si no hay datos suficientes para comparar
-        if (not user_hc or user_hc == "") and (not user_patient or user_patient == ""):
-            return True  # No se puede verificar, asumir que existe (pagado)
-        
-        # Buscar en archivos del HOSPITAL
-        for hospital_info in hospital_data_list:
-            hospital_df = hospital_info['dataframe']
-            
-            for _, hospital_row in hospital_df.iterrows():
-                hospital_hc = None
-                hospital_patient = None
-                hospital_date = None
-                
-                # Obtener datos del HOSPITAL
-                if hospital_info['hc_column'] and hospital_info['hc_column'] in hospital_row:
-                    hospital_hc = self.normalize_text(hospital_row[hospital_info['hc_column']])
-                
-                if hospital_info['patient_column'] and hospital_info['patient_column'] in hospital_row:
-                    hospital_patient = self.normalize_text(hospital_row[hospital_info['patient_column']])
-                
-                if hospital_info['date_column'] and hospital_info['date_column'] in hospital_row:
-                    hospital_date = self.normalize_date(hospital_row[hospital_info['date_column']])
-                
-                # Skip filas vacías del hospital
-                if (not hospital_hc or hospital_hc == "") and (not hospital_patient or hospital_patient == ""):
-                    continue
-                
-                # Comparar - priorizar HC si existe
-                match_found = False
-                
-                # Caso 1: Ambos tienen HC válida
-                if (user_hc and user_hc != "" and 
-                    hospital_hc and hospital_hc != ""):
-                    if user_hc == hospital_hc:
-                        # HC coincide, verificar fecha si ambas existen
-                        if user_date and hospital_date:
-                            if user_date == hospital_date:
-                                return True  # Encontrado con fecha coincidente (PAGADO)
-                            # Si fechas no coinciden, continuar buscando
-                        else:
-                            return True  # HC coincide y al menos una no tiene fecha (PAGADO)
-                
-                # Caso 2: Comparar por nombre si no hay HC o no coincide HC
-                elif (user_patient and user_patient != "" and 
-                      hospital_patient and hospital_patient != ""):
-                    if user_patient == hospital_patient:
-                        # Nombre coincide, verificar fecha si ambas existen
-                        if user_date and hospital_date:
-                            if user_date == hospital_date:
-                                return True  # Encontrado con fecha coincidente (PAGADO)
-                            # Si fechas no coinciden, continuar buscando
-                        else:
-                            return True  # Nombre coincide y al menos una no tiene fecha (PAGADO)
-        
-        return False  # No encontrado en hospital (NO PAGADO)
+    def forget_loaded_files(self, filepaths):
+        """Quita del registro de la sesión los archivos indicados"""
+        for key in [key for key in self.loaded_files if key[0] in filepaths]:
+            del self.loaded_files[key]
     
     def process_files(self):
         if not self.hospital_files:
@@ -1752,17 +2057,21 @@ class PatientControlApp:
             return
         
         try:
-            self.status_label.config(text="Cargando archivos...")
+            self.status_label.config(text=f"Cargando archivos (lector de Excel configurado: {excel_engine()})...")
             self.progress['value'] = 0
             self.root.update()
             
+            # Cargar en paralelo los archivos que no estén ya en el registro de la sesión
+            self.load_files_parallel(self.hospital_files, key_columns_only=True, label="archivo del hospital")
+            self.load_files_parallel(self.user_files, label="archivo del usuario")
+            
             # Cargar archivos del hospital
             hospital_data_list = []
             for i, filepath in enumerate(self.hospital_files):
                 self.status_label.config(text=f"Cargando archivo del hospital {i+1}/{len(self.hospital_files)}")
                 self.root.update()
                 
-                data, error = self.load_excel_file(filepath)
+                data, error = self.get_loaded_file(filepath, key_columns_only=True)
                 if error:
                     messagebox.showerror("Error", error)
                     return
@@ -1774,52 +2083,27 @@ class PatientControlApp:
                 self.status_label.config(text=f"Cargando archivo del usuario {i+1}/{len(self.user_files)}")
                 self.root.update()
                 
-                data, error = self.load_excel_file(filepath)
+                data, error = self.get_loaded_file(filepath)
                 if error:
                     messagebox.showerror("Error", error)
                     return
                 user_data_list.append(data)
             
-            # Procesar comparaciones - LÓGICA CORREGIDA
-            missing_patients = []
-            total_rows = sum(len(data['dataframe']) for data in user_data_list)  # Total de filas del USUARIO
-            processed_rows = 0
+            # Normalizar el HOSPITAL una sola vez en índices por HC y por paciente
+            self.status_label.config(text="Indexando archivos del hospital...")
+            self.root.update()
+            hospital_index = self.build_hospital_index(hospital_data_list)
             
+            # Procesar comparaciones - LÓGICA CORREGIDA
             self.status_label.config(text="Procesando comparaciones...")
             
-            # LÓGICA CORREGIDA: Buscar pacientes del USUARIO en archivos del HOSPITAL
-            for user_info in user_data_list:
-                user_df = user_info['dataframe']
-                
-                for _, user_row in user_df.iterrows():
-                    processed_rows += 1
-                    progress_percent = (processed_rows / total_rows) * 100
-                    self.progress['value'] = progress_percent
-                    
-                    if processed_rows % 10 == 0:  # Actualizar cada 10 filas
-                        self.status_label.config(text=f"Procesando: {processed_rows}/{total_rows}")
-                        self.root.update()
-                    
-                    # Verificar que la fila del USUARIO tenga datos válidos
-                    has_valid_data = False
-                    for col in user_df.columns:
-                        if not pd.isna(user_row[col]) and str(user_row[col]).strip() != "":
-                            has_valid_data = True
-                            break
-                    
-                    if not has_valid_data:
-                        continue  # Skip filas completamente vacías
-                    
-                    # Buscar este paciente del USUARIO en los archivos del HOSPITAL
-                    found = self.search_user_patient_in_hospital_files(user_row, user_info, hospital_data_list)
-                    
-                    if not found:
-                        # Crear registro del paciente del USUARIO que NO fue encontrado en hospital (no pagado)
-                        missing_record = {}
-                        for col in user_df.columns:
-                            missing_record[col] = user_row[col]
-                        missing_record['Archivo_Origen_Usuario'] = user_info['filename']
-                        missing_patients.append(missing_record)
+            def show_progress(processed_rows, total_rows):
+                self.progress['value'] = (processed_rows / total_rows) * 100
+                if processed_rows % 10 == 0:  # Actualizar cada 10 filas
+                    self.status_label.config(text=f"Procesando: {processed_rows}/{total_rows}")
+                    self.root.update()
+            
+            missing_patients = self.find_missing_patients(user_data_list, hospital_index, show_progress)
             
             # Generar reporte
             if missing_patients:
@@ -1831,7 +2115,8 @@ class PatientControlApp:
                                   "Proceso completado. Todos los pacientes atendidos por el usuario aparecen en los archivos del hospital.")
             
             self.progress['value'] = 100
-            self.status_label.config(text="Proceso completado")
+            readers = describe_readers(data['excel_reader'] for data in hospital_data_list + user_data_list)
+            self.status_label.config(text=f"Proceso completado (lector de Excel usado: {readers})")
             
         except Exception as e:
             messagebox.showerror("Error", f"Error durante el procesamiento: {str(e)}")
@@ -1842,64 +2127,7 @@ class PatientControlApp:
         if not missing_patients:
             return
         
-        # Los datos ya vienen del archivo del USUARIO con las columnas correctas
-        # Solo necesitamos mapear a las columnas estándar si es necesario
-        
-        desired_columns = ['Hc', 'Paciente', 'Cobertura', 'Consultorio', 'Estado', 'Fecha']
-        
-        # Crear un nuevo DataFrame con las columnas deseadas
-        report_data = []
-        for patient in missing_patients:
-            # Los datos ya vienen del usuario, solo necesitamos mapearlos si tienen nombres diferentes
-            row_data = {}
-            
-            # Mapear directamente si las columnas ya existen con los nombres correctos
-            for desired_col in desired_columns:
-                row_data[desired_col] = ""
-                
-                # Buscar la columna en los datos originales del usuario
-                for key, value in patient.items():
-                    if key == 'Archivo_Origen_Usuario':
-                        continue
-                        
-                    key_lower = str(key).lower().strip()
-                    
-                    if desired_col == 'Hc':
-                        if any(hc_pattern in key_lower for hc_pattern in ['hc', 'historia', 'hist']):
-                            row_data[desired_col] = value if not pd.isna(value) else ""
-                            break
-                    elif desired_col == 'Paciente':
-                        if any(patient_pattern in key_lower for patient_pattern in ['paciente', 'nombre', 'apellido']):
-                            row_data[desired_col] = value if not pd.isna(value) else ""
-                            break
-                    elif desired_col == 'Cobertura':
-                        if any(cob_pattern in key_lower for cob_pattern in ['cobertura', 'obra', 'social', 'plan', 'seguro']):
-                            row_data[desired_col] = value if not pd.isna(value) else ""
-                            break
-                    elif desired_col == 'Consultorio':
-                        if any(cons_pattern in key_lower for cons_pattern in ['consultorio', 'consulta', 'atencion', 'servicio']):
-                            row_data[desired_col] = value if not pd.isna(value) else ""
-                            break
-                    elif desired_col == 'Estado':
-                        if any(est_pattern in key_lower for est_pattern in ['estado', 'status', 'situacion']):
-                            row_data[desired_col] = value if not pd.isna(value) else ""
-                            break
-                    elif desired_col == 'Fecha':
-                        if any(fecha_pattern in key_lower for fecha_pattern in ['fecha', 'date', 'dia', 'day']):
-                            if not pd.isna(value):
-                                try:
-                                    if isinstance(value, datetime):
-                                        row_data[desired_col] = value.strftime('%d/%m/%Y')
-                                    else:
-                                        row_data[desired_col] = str(value)
-                                except:
-                                    row_data[desired_col] = str(value)
-                            break
-            
-            report_data.append(row_data)
-        
-        # Crear DataFrame con formato estandarizado
-        df_report = pd.DataFrame(report_data, columns=desired_columns)
+        df_report = self.build_report_dataframe(missing_patients)
         
         # Guardar archivo
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -1941,21 +2169,25 @@ class PatientControlApp:
             messagebox.showinfo("Información", "No hay archivos cargados")
             return
         
-        info_text = "INFORMACIÓN DE ARCHIVOS CARGADOS\n" + "="*50 + "\n\n"
+        info_text = "INFORMACIÓN DE ARCHIVOS CARGADOS\n" + "="*50 + "\n"
+        info_text += f"Lector de Excel configurado: {excel_engine()}\n\n"
         
         # Información de archivos del hospital
         if self.hospital_files:
             info_text += "ARCHIVOS DEL HOSPITAL:\n" + "-"*25 + "\n"
             for i, filepath in enumerate(self.hospital_files):
                 try:
-                    data, error = self.load_excel_file(filepath)
+                    data, error = self.get_file_info(filepath)
                     if error:
                         info_text += f"{i+1}. {os.path.basename(filepath)} - ERROR: {error}\n"
                     else:
                         df = data['dataframe']
                         info_text += f"{i+1}. {os.path.basename(filepath)}\n"
-                        info_text += f"   - Filas: {len(df)}\n"
-                        info_text += f"   - Columnas: {list(df.columns)}\n"
+                        info_text += f"   - Filas: {data['sheet_rows']}\n"
+                        if data['key_columns_only']:
+                            info_text += f"   - Filas con HC, paciente o fecha: {len(df)}\n"
+                        info_text += f"   - Columnas: {data['sheet_columns']}\n"
+                        info_text += f"   - Lector usado: {data['excel_reader']}\n"
                         info_text += f"   - HC detectada: {data['hc_column']}\n"
                         info_text += f"   - Paciente detectado: {data['patient_column']}\n"
                         info_text += f"   - Fecha detectada: {data['date_column']}\n\n"
@@ -1967,14 +2199,17 @@ class PatientControlApp:
             info_text += "ARCHIVOS DEL USUARIO:\n" + "-"*25 + "\n"
             for i, filepath in enumerate(self.user_files):
                 try:
-                    data, error = self.load_excel_file(filepath)
+                    data, error = self.get_file_info(filepath)
                     if error:
                         info_text += f"{i+1}. {os.path.basename(filepath)} - ERROR: {error}\n"
                     else:
                         df = data['dataframe']
                         info_text += f"{i+1}. {os.path.basename(filepath)}\n"
-                        info_text += f"   - Filas: {len(df)}\n"
-                        info_text += f"   - Columnas: {list(df.columns)}\n"
+                        info_text += f"   - Filas: {data['sheet_rows']}\n"
+                        if data['key_columns_only']:
+                            info_text += f"   - Filas con HC, paciente o fecha: {len(df)}\n"
+                        info_text += f"   - Columnas: {data['sheet_columns']}\n"
+                        info_text += f"   - Lector usado: {data['excel_reader']}\n"
                         info_text += f"   - HC detectada: {data['hc_column']}\n"
                         info_text += f"   - Paciente detectado: {data['patient_column']}\n"
                         info_text += f"   - Fecha detectada: {data['date_column']}\n\n"
@@ -1996,6 +2231,10 @@ class PatientControlApp:
         text_widget.insert(tk.END, info_text)
         text_widget.configure(state=tk.DISABLED)
 
+def load_excel_file_in_process(filepath, key_columns_only=False):
+    """Carga un archivo en un proceso aparte (sin interfaz); usado por el pool de carga"""
+    return PatientMatcher().load_excel_file(filepath, key_columns_only)
+
 def main():
     root = tk.Tk()
     app = PatientControlApp(root)
@@ -2007,5 +2246,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    freeze_support()  # Necesario para el pool de procesos en ejecutables (Windows)
     main()
  
\ No newline at end of file
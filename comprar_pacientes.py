@@ -4,18 +4,54 @@ import pandas as pd
 import numpy as np
 import os
 from pathlib import Path
+from openpyxl import Workbook
+from cache_excel import (read_excel_cached, read_excel_header, should_stream, iter_excel_batches, excel_engine,
+                         file_format, reader_used, csv_separator)
+from carga_paralela import map_files
+from tiempos import StageTimer, RunReport
+from multiprocessing import freeze_support
 
-def clean_monto(value):
-    """Limpia el monto para convertirlo a float (ej. '9.528,62 $' -> 9528.62)."""
-    if pd.isna(value):
-        return 0.0
-    if isinstance(value, str):
-        value = value.strip().replace('$', '').replace(' ', '').replace('.', '').replace(',', '.')
-        try:
-            return float(value)
-        except ValueError:
-            return 0.0
-    return float(value)
+def parse_montos(values, decimal=','):
+    """Convierte una columna de montos a float en una sola pasada (ej. '9.528,62 $' -> 9528.62).
+
+    Acepta textos, celdas ya numéricas y NaN. Con decimal=',' (formato argentino) el punto
+    es separador de miles; con decimal='.' lo es la coma. Cada valor distinto se convierte
+    una sola vez. Retorna (serie de floats, cantidad de valores no reconocidos);
+    los no reconocidos quedan en 0.0 y los NaN en 0.0 sin contarse como error.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float).fillna(0.0), 0
+    
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    
+    # Textos: quitar '$', espacios y separador de miles; el decimal pasa a ser el punto
+    thousands = '.' if decimal == ',' else ','
+    is_text = uniques.map(lambda v: isinstance(v, str)).astype(bool)
+    text = (uniques[is_text].str.strip()
+            .str.replace(f'[$ {thousands}]', '', regex=True)
+            .str.replace(decimal, '.', regex=False))
+    
+    parsed = pd.Series(np.nan, index=uniques.index)
+    parsed[is_text] = pd.to_numeric(text, errors='coerce')
+    parsed[~is_text] = pd.to_numeric(uniques[~is_text], errors='coerce')
+    
+    valid = codes >= 0
+    montos = np.zeros(len(codes))
+    montos[valid] = parsed.fillna(0.0).to_numpy()[codes[valid]]
+    invalid_count = int(parsed.isna().to_numpy()[codes[valid]].sum())
+    
+    return pd.Series(montos, index=values.index), invalid_count
+
+def monto_decimal(file_path):
+    """Separador decimal de los montos en texto del archivo.
+
+    Los Excel y los CSV separados por ';' vienen en formato argentino ('1.234,50');
+    un CSV separado por comas no puede usar la coma como decimal ('1234.50').
+    """
+    if file_format(file_path) == 'csv' and csv_separator(file_path) != ';':
+        return '.'
+    return ','
 
 def detect_file_type(filename):
     """Detecta el tipo de archivo basado en el nombre."""
@@ -92,6 +128,65 @@ def get_column_mapping(file_type):
             'obra_social': 'Obra_Social'
         }
 
+def relevant_columns(file_path):
+    """Resuelve, solo con el encabezado, las columnas que process_dataframe va a usar.
+
+    Devuelve (usecols, dtypes); usecols es None si no hay columnas reconocibles.
+    """
+    header = read_excel_header(file_path)
+    column_mapping = get_column_mapping(detect_file_type(os.path.basename(file_path)))
+    
+    normalized = {col: str(col).strip().lower().replace(' ', '_') for col in header.columns}
+    usecols = [col for col, name in normalized.items() if name in column_mapping]
+    
+    if not usecols:
+        return None, {}
+    
+    # HC y Monto se leen como texto: Monto se convierte después con el separador decimal
+    # del archivo (ver monto_decimal), igual en Excel que en CSV
+    text_fields = ('HC', 'Monto') if file_format(file_path) in ('excel', 'csv') else ('HC',)
+    dtypes = {col: object for col in usecols if column_mapping[normalized[col]] in text_fields}
+    return usecols, dtypes
+
+def read_relevant_columns(file_path, columns=None):
+    """Lee solo las columnas que process_dataframe va a usar según el tipo de archivo.
+
+    Primero lee el encabezado y resuelve las columnas con get_column_mapping (o usa
+    columns, lo que ya devolvió relevant_columns); después carga únicamente esas
+    columnas. En Excel y CSV, HC y Monto se leen sin conversión de tipos: una HC con
+    celdas vacías no pasa a float ('123.0') y un monto '1.234' de un CSV con ';' no se
+    toma como 1.234 (process_dataframe lo convierte con monto_decimal).
+    """
+    usecols, dtypes = columns if columns is not None else relevant_columns(file_path)
+    
+    # Sin columnas reconocibles: leer todo y dejar que process_dataframe decida
+    if usecols is None:
+        return read_excel_cached(file_path)
+    
+    return read_excel_cached(file_path, usecols=usecols, dtype=dtypes)
+
+def iter_processed_batches(file_path, batch_size=None, timer=None):
+    """Lee un archivo grande en streaming y genera lotes ya normalizados.
+
+    Cada lote es (filas leídas, DataFrame procesado con HC, Nombre, Fecha, Monto...);
+    su índice es la fila de origen en el archivo. Lo acotado es la lectura: nunca se
+    arma la hoja cruda completa, pero quien junte los lotes sí tiene el resultado entero.
+    Con timer (un StageTimer) se acumula el tiempo de cada etapa.
+    """
+    timer = timer or StageTimer()
+    with timer('deteccion_columnas'):
+        usecols, dtypes = relevant_columns(file_path)
+    dtype = object if file_format(file_path) == 'excel' else dtypes
+    batches = iter_excel_batches(file_path, usecols=usecols, dtype=dtype, batch_size=batch_size)
+    while True:
+        with timer('carga'):
+            batch = next(batches, None)
+        if batch is None:
+            return
+        with timer('normalizacion'):
+            processed_df = process_dataframe(batch, file_path)
+        yield len(batch), processed_df
+
 def process_dataframe(df, file_path):
     """Procesa un DataFrame según el tipo de archivo."""
     if df is None or df.empty:
@@ -134,7 +229,9 @@ def process_dataframe(df, file_path):
     
     # Procesar Monto si existe y tiene datos
     if 'Monto' in df.columns:
-        df['Monto'] = df['Monto'].apply(clean_monto)
+        df['Monto'], invalid_montos = parse_montos(df['Monto'], monto_decimal(file_path))
+        if invalid_montos:
+            print(f"  Advertencia: {invalid_montos} montos no reconocidos en {filename} (se tomaron como 0)")
     else:
         df['Monto'] = 0.0
     
@@ -181,17 +278,314 @@ def process_dataframe(df, file_path):
     
     return result_df
 
-def compare_records(user_file, hospital_files, output_dir=None):
-    """Compara registro con los del hospital y genera un Excel con discrepancias."""
+def load_hospital_file(file_path):
+    """Lee y procesa un archivo del hospital; se ejecuta en un proceso aparte.
+
+    Devuelve las filas leídas, el DataFrame ya procesado (solo las columnas relevantes)
+    y los tiempos por etapa medidos en el proceso (StageTimer.summary()).
+    Los archivos muy grandes se leen por lotes sin armar la hoja cruda completa; los lotes
+    ya procesados (solo las columnas relevantes) se concatenan en un único DataFrame.
+    """
+    timer = StageTimer()
+    if should_stream(file_path):
+        loaded_rows, parts = 0, []
+        for batch_rows, processed_df in iter_processed_batches(file_path, timer=timer):
+            loaded_rows += batch_rows
+            if len(processed_df) > 0:
+                parts.append(processed_df)
+        return (loaded_rows, pd.concat(parts) if parts else pd.DataFrame(),
+                timer.summary(reader=reader_used(file_path)))
+    
+    with timer('deteccion_columnas'):
+        columns = relevant_columns(file_path)
+    with timer('carga'):
+        df = read_relevant_columns(file_path, columns)
+    with timer('normalizacion'):
+        processed_df = process_dataframe(df, file_path)
+    return len(df), processed_df, timer.summary(reader=reader_used(file_path))
+
+# Filas por bloque al escribir el Excel de salida en streaming
+OUTPUT_CHUNK_ROWS = 10000
+
+# Tamaño máximo de una hoja de Excel (filas con el encabezado, columnas)
+EXCEL_MAX_ROWS, EXCEL_MAX_COLS = 1048576, 16384
+
+def oversized_sheets(sheets):
+    """Nombres de las hojas de [(nombre de hoja, DataFrame)] que no entran en una hoja de Excel."""
+    return [sheet_name for sheet_name, df in sheets
+            if len(df) + 1 > EXCEL_MAX_ROWS or len(df.columns) > EXCEL_MAX_COLS]
+
+def write_excel_streaming(output_file, sheets):
+    """Escribe [(nombre de hoja, DataFrame)] en un Excel fila por fila (openpyxl write_only).
+
+    Los DataFrames ya están completos en memoria (las hojas de discrepancias necesitan
+    todos los registros); lo que se evita es la copia del libro entero en celdas de
+    openpyxl que arma pd.ExcelWriter: cada fila se agrega a la hoja write_only y se
+    vuelca al archivo. Los valores nulos (NaN, NaT) quedan como celdas vacías, igual
+    que con to_excel. Una hoja más grande que el límite de Excel da ValueError antes de
+    escribir nada, como pd.ExcelWriter (openpyxl write_only la escribiría inválida).
+    """
+    too_large = oversized_sheets(sheets)
+    if too_large:
+        raise ValueError(f"Hojas demasiado grandes para Excel (máximo {EXCEL_MAX_ROWS - 1} filas y "
+                         f"{EXCEL_MAX_COLS} columnas): {', '.join(too_large)}")
+    workbook = Workbook(write_only=True)
+    for sheet_name, df in sheets:
+        sheet = workbook.create_sheet(title=sheet_name)
+        sheet.append([str(col) for col in df.columns])
+        for start in range(0, len(df), OUTPUT_CHUNK_ROWS):
+            chunk = df.iloc[start:start + OUTPUT_CHUNK_ROWS].astype(object)
+            chunk = chunk.where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                sheet.append(row)
+    workbook.save(output_file)
+
+def write_parquet_sidecar(path, df):
+    """Guarda df en Parquet comprimido (zstd); las columnas object con tipos mezclados van como texto."""
+    try:
+        df.to_parquet(path, index=False, compression='zstd')
+    except ImportError:
+        raise
+    except Exception:
+        # pyarrow no acepta columnas object que mezclan números y texto
+        mixed = df.select_dtypes(include='object').columns
+        df.astype({col: 'string' for col in mixed}).to_parquet(path, index=False, compression='zstd')
+
+def write_raw_data_sidecar(output_file, raw_data):
+    """Escribe cada (hoja, DataFrame) de raw_data en un Parquet junto al reporte.
+
+    Devuelve la hoja índice para el Excel: nombre de los datos, enlace al archivo
+    (relativo a la carpeta del reporte), ruta completa, filas y columnas.
+    """
+    base = os.path.splitext(output_file)[0]
+    index_rows = []
+    for sheet_name, df in raw_data:
+        path = f"{base}_{sheet_name}.parquet"
+        write_parquet_sidecar(path, df)
+        name = os.path.basename(path)
+        index_rows.append({
+            'Datos': sheet_name,
+            'Archivo': f'=HYPERLINK("{name}", "{name}")',
+            'Ruta': os.path.abspath(path),
+            'Filas': len(df),
+            'Columnas': len(df.columns)
+        })
+    return pd.DataFrame(index_rows)
+
+def find_discrepancies(user_df, hospital_df):
+    """Cruza los registros del usuario con los del hospital y arma las hojas del reporte.
+
+    Devuelve [(nombre de hoja, DataFrame)] en el orden del Excel, sin los datos originales.
+    """
+    # Verificar que ambos DataFrames tengan las columnas necesarias
+    required_user_cols = ['HC', 'Fecha']
+    required_hospital_cols = ['HC', 'Fecha', 'Archivo_Origen', 'Tipo_Archivo']
+    
+    missing_user_cols = [col for col in required_user_cols if col not in user_df.columns]
+    missing_hospital_cols = [col for col in required_hospital_cols if col not in hospital_df.columns]
+    
+    if missing_user_cols:
+        raise Exception(f"Faltan columnas en archivo usuario: {missing_user_cols}")
+    if missing_hospital_cols:
+        raise Exception(f"Faltan columnas en archivos hospital: {missing_hospital_cols}")
+    
+    # Realizar merge para encontrar discrepancias (HC + Fecha + número de visita en el día como clave)
+    # El rango numera las visitas repetidas del mismo paciente en el mismo día: la 2.ª visita del
+    # usuario se empareja con la 2.ª del hospital, así las duplicadas no se multiplican ni se pierden
+    key_cols = ['HC', 'Fecha', 'Rango_Dia']
+    
+    # Columnas que necesita cada reporte, para no volver a cruzar con los datos completos
+    user_merge_cols = ['HC', 'Fecha', 'Nombre', 'Monto', 'Hora', 'Plan', 'Obra_Social']
+    hospital_merge_cols = ['HC', 'Fecha', 'Nombre', 'Monto', 'Archivo_Origen', 'Tipo_Archivo',
+                           'Cobertura', 'Desgrupo', 'Desc_Cob', 'Obra_Social']
+    
+    # Filtrar solo las columnas que existen
+    user_merge_cols = [col for col in user_merge_cols if col in user_df.columns]
+    hospital_merge_cols = [col for col in hospital_merge_cols if col in hospital_df.columns]
+    
+    print(f"Realizando merge con columnas usuario: {user_merge_cols}")
+    print(f"Realizando merge con columnas hospital: {hospital_merge_cols}")
+    
+    user_keyed = user_df[user_merge_cols].assign(
+        Rango_Dia=user_df.groupby(['HC', 'Fecha'], sort=False).cumcount())
+    hospital_keyed = hospital_df[hospital_merge_cols].assign(
+        Rango_Dia=hospital_df.groupby(['HC', 'Fecha'], sort=False).cumcount())
+    
+    merged = user_keyed.merge(
+        hospital_keyed,
+        on=key_cols, 
+        how='outer', 
+        suffixes=('_usuario', '_hospital'), 
+        indicator=True
+    )
+    
+    print(f"Merge completado. Total registros: {len(merged)}")
+    
+    def side_columns(rows, cols_to_keep, side_cols, suffix):
+        """Columnas de un lado del merge, sin sufijo (si la columna está en ambos lados toma la de ese lado)"""
+        result = pd.DataFrame(index=rows.index)
+        for col in cols_to_keep:
+            if col + suffix in rows.columns:
+                result[col] = rows[col + suffix]
+            elif col in side_cols:
+                result[col] = rows[col]
+        return result
+    
+    # Extra en registro del usuario (a favor)
+    extra_user_mask = merged['_merge'] == 'left_only'
+    
+    print(f"Registros extra en usuario: {extra_user_mask.sum()}")
+    
+    if extra_user_mask.any():
+        # Seleccionar columnas relevantes
+        cols_to_keep = ['HC', 'Fecha', 'Nombre', 'Monto', 'Hora', 'Plan', 'Obra_Social']
+        extra_user = side_columns(merged[extra_user_mask], cols_to_keep, user_merge_cols, '_usuario')
+    else:
+        extra_user = pd.DataFrame(columns=['HC', 'Fecha', 'Nombre', 'Monto'])
+    
+    # Extra en registros del hospital (en contra)
+    extra_hospital_mask = merged['_merge'] == 'right_only'
+    
+    print(f"Registros extra en hospital: {extra_hospital_mask.sum()}")
+    
+    if extra_hospital_mask.any():
+        # Seleccionar columnas relevantes
+        cols_to_keep = ['HC', 'Fecha', 'Nombre', 'Monto', 'Archivo_Origen', 'Tipo_Archivo',
+                        'Cobertura', 'Desgrupo', 'Desc_Cob', 'Obra_Social']
+        extra_hospital = side_columns(merged[extra_hospital_mask], cols_to_keep, hospital_merge_cols, '_hospital')
+    else:
+        extra_hospital = pd.DataFrame(columns=['HC', 'Fecha', 'Nombre', 'Monto', 'Archivo_Origen', 'Tipo_Archivo'])
+    
+    # Ordenar resultados
+    extra_user = extra_user.sort_values(by=['Nombre', 'Fecha']).reset_index(drop=True)
+    extra_hospital = extra_hospital.sort_values(by=['Nombre', 'Fecha']).reset_index(drop=True)
+    
+    # Crear estadísticas por historia clínica
+    user_stats = pd.DataFrame()
+    hospital_stats = pd.DataFrame()
+    
+    if not extra_user.empty:
+        user_stats = extra_user.groupby('HC').agg({
+            'Fecha': 'count',
+            'Monto': 'sum',
+            'Nombre': 'first'
+        }).rename(columns={'Fecha': 'Cantidad_Fechas'}).reset_index()
+    
+    if not extra_hospital.empty:
+        hospital_stats = extra_hospital.groupby('HC').agg({
+            'Fecha': 'count', 
+            'Monto': 'sum',
+            'Nombre': 'first'
+        }).rename(columns={'Fecha': 'Cantidad_Fechas'}).reset_index()
+    
+    # Crear resumen general
+    summary = pd.DataFrame({
+        'Concepto': [
+            'Registros en mi archivo',
+            'Registros en hospital (total)',
+            'Extra en mi registro (registros)',
+            'Extra en hospital (registros)',
+            'Extra en mi registro (pacientes únicos)',
+            'Extra en hospital (pacientes únicos)',
+            'Diferencia neta (registros)',
+            'Diferencia neta (monto)'
+        ],
+        'Cantidad': [
+            len(user_df),
+            len(hospital_df),
+            len(extra_user),
+            len(extra_hospital),
+            len(user_stats),
+            len(hospital_stats),
+            len(extra_user) - len(extra_hospital),
+            extra_user['Monto'].sum() - extra_hospital['Monto'].sum()
+        ]
+    })
+    
+    # Crear resumen por tipo de archivo del hospital
+    hospital_summary = pd.DataFrame(columns=['Tipo_Archivo', 'Cantidad_Registros', 'Monto_Total'])
+    if not extra_hospital.empty and 'Tipo_Archivo' in extra_hospital.columns:
+        hospital_summary = extra_hospital.groupby('Tipo_Archivo').agg({
+            'HC': 'count',
+            'Monto': 'sum'
+        }).reset_index()
+        hospital_summary.columns = ['Tipo_Archivo', 'Cantidad_Registros', 'Monto_Total']
+
+    # Hojas del reporte, en orden (las estadísticas solo si hay discrepancias)
+    sheets = [
+        ('Resumen_General', summary),                 # Resumen general
+        ('Resumen_Hospital', hospital_summary),       # Resumen por tipo de hospital
+        ('Extra_Mi_Registro', extra_user),            # Registros extra del usuario
+        ('Extra_Hospital', extra_hospital),           # Registros extra del hospital
+    ]
+    if not user_stats.empty:
+        sheets.append(('Stats_Mi_Registro', user_stats))    # Estadísticas por paciente - usuario
+    if not hospital_stats.empty:
+        sheets.append(('Stats_Hospital', hospital_stats))   # Estadísticas por paciente - hospital
+    
+    return sheets
+
+def write_report(output_file, sheets, raw_data, streaming_output=True, raw_data_sidecar=False):
+    """Escribe el reporte: las hojas de discrepancias y los datos originales (raw_data).
+
+    Con raw_data_sidecar los datos originales van a Parquet junto al reporte
+    (si falta pyarrow quedan en el Excel). Si los datos originales no entran en
+    una hoja de Excel van a Parquet aunque no se haya pedido.
+    """
+    too_large = oversized_sheets(raw_data)
+    if too_large and not raw_data_sidecar:
+        print(f"  Advertencia: {', '.join(too_large)} supera el límite de filas de Excel; "
+              f"los datos originales van a Parquet")
+        raw_data_sidecar = True
+    # Datos originales para referencia: en el Excel o en Parquet aparte
+    if raw_data_sidecar:
+        try:
+            raw_data = [('Datos_Originales', write_raw_data_sidecar(output_file, raw_data))]
+            print(f"Datos originales guardados en Parquet junto a {os.path.basename(output_file)}")
+        except ImportError:
+            print("  Advertencia: no se pudo escribir Parquet (falta pyarrow); los datos originales van al Excel")
+    sheets = sheets + raw_data
+    
+    # Exportar resultados
+    if streaming_output:
+        write_excel_streaming(output_file, sheets)
+    else:
+        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+            for sheet_name, df in sheets:
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+def compare_records(user_file, hospital_files, output_dir=None, max_workers=None, streaming_output=True,
+                    raw_data_sidecar=False):
+    """Compara registro con los del hospital y genera un Excel con discrepancias.
+
+    Los archivos del hospital se cargan en paralelo, un archivo por proceso
+    (max_workers procesos; por defecto GUITA_ZOKO_WORKERS o uno por núcleo).
+    Con streaming_output el Excel se escribe fila por fila sin armar el libro de
+    openpyxl en memoria (las hojas sí están completas como DataFrames); si no, se
+    arma completo con pd.ExcelWriter. Con raw_data_sidecar los datos
+    originales van a archivos Parquet junto al reporte en lugar de las hojas
+    Datos_Usuario y Datos_Hospital (el Excel lleva una hoja con los enlaces).
+    Los tiempos de cada etapa se imprimen y se guardan en un JSON junto al reporte
+    (discrepancias_pacientes_tiempos.json).
+    """
     try:
+        report = RunReport('compare_records', log=print)
+        print(f"Lector de Excel configurado: {excel_engine()}")
         print(f"Procesando archivo de usuario: {user_file}")
         
         # Procesar archivo del usuario
-        user_df = pd.read_excel(user_file)
+        with report.stage('deteccion_columnas', user_file):
+            columns = relevant_columns(user_file)
+        with report.stage('carga', user_file) as stage:
+            user_df = read_relevant_columns(user_file, columns)
+            stage['filas'] = len(user_df)
         print(f"Archivo de usuario cargado. Filas: {len(user_df)}")
+        loaded_rows = len(user_df)
         
-        user_df = process_dataframe(user_df, user_file)
+        with report.stage('normalizacion', user_file, rows=loaded_rows):
+            user_df = process_dataframe(user_df, user_file)
         print(f"Archivo de usuario procesado. Filas: {len(user_df)}")
+        report.add_file(user_file, 'usuario', loaded_rows, reader=reader_used(user_file))
         
         if len(user_df) == 0:
             raise Exception("El archivo de usuario no contiene registros válidos")
@@ -199,213 +593,44 @@ def compare_records(user_file, hospital_files, output_dir=None):
         # Procesar archivos del hospital
         hospital_dfs = []
         
-        for file_path in hospital_files:
-            try:
-                print(f"Procesando archivo de hospital: {os.path.basename(file_path)}")
-                df = pd.read_excel(file_path)
-                print(f"  Cargado. Filas: {len(df)}")
-                
-                processed_df = process_dataframe(df, file_path)
-                print(f"  Procesado. Filas: {len(processed_df)}")
-                
-                if len(processed_df) > 0:
-                    hospital_dfs.append(processed_df)
-                    
-            except Exception as e:
-                print(f"  Error procesando {file_path}: {str(e)}")
-                continue
-        
-        if not hospital_dfs:
-            raise Exception("No se pudieron procesar archivos del hospital")
-        
-        # Combinar archivos del hospital
-        hospital_df = pd.concat(hospital_dfs, ignore_index=True)
-        print(f"Archivos de hospital combinados. Total filas: {len(hospital_df)}")
-        
-        # Verificar que ambos DataFrames tengan las columnas necesarias
-        required_user_cols = ['HC', 'Fecha']
-        required_hospital_cols = ['HC', 'Fecha', 'Archivo_Origen', 'Tipo_Archivo']
-        
-        missing_user_cols = [col for col in required_user_cols if col not in user_df.columns]
-        missing_hospital_cols = [col for col in required_hospital_cols if col not in hospital_df.columns]
-        
-        if missing_user_cols:
-            raise Exception(f"Faltan columnas en archivo usuario: {missing_user_cols}")
-        if missing_hospital_cols:
-            raise Exception(f"Faltan columnas en archivos hospital: {missing_hospital_cols}")
-        
-        # Realizar merge para encontrar discrepancias (HC + Fecha como clave compuesta)
-        key_cols = ['HC', 'Fecha']
-        
-        # Preparar columnas para el merge
-        user_merge_cols = ['HC', 'Fecha', 'Nombre', 'Monto']
-        hospital_merge_cols = ['HC', 'Fecha', 'Nombre', 'Monto', 'Archivo_Origen', 'Tipo_Archivo']
-        
-        # Filtrar solo las columnas que existen
-        user_merge_cols = [col for col in user_merge_cols if col in user_df.columns]
-        hospital_merge_cols = [col for col in hospital_merge_cols if col in hospital_df.columns]
+        with report.stage('carga_archivos_hospital'):
+            results = map_files(load_hospital_file, hospital_files, max_workers=max_workers)
         
-        print(f"Realizando merge con columnas usuario: {user_merge_cols}")
-        print(f"Realizando merge con columnas hospital: {hospital_merge_cols}")
-        
-        merged = user_df[user_merge_cols].merge(
-            hospital_df[hospital_merge_cols],
-            on=key_cols, 
-            how='outer', 
-            suffixes=('_usuario', '_hospital'), 
-            indicator=True
-        )
-        
-        print(f"Merge completado. Total registros: {len(merged)}")
-        
-        # Extra en registro del usuario (a favor)
-        extra_user_mask = merged['_merge'] == 'left_only'
-        extra_user = merged[extra_user_mask].copy()
-        
-        print(f"Registros extra en usuario: {len(extra_user)}")
-        
-        if not extra_user.empty:
-            # Limpiar y organizar columnas
-            extra_user['Nombre'] = extra_user.get('Nombre_usuario', extra_user.get('Nombre_hospital', ''))
-            extra_user['Monto'] = extra_user.get('Monto_usuario', extra_user.get('Monto_hospital', 0.0))
-            
-            # Agregar información adicional del archivo usuario
-            user_additional = user_df.copy()
-            if not user_additional.empty:
-                extra_user = extra_user.merge(
-                    user_additional[['HC', 'Fecha'] + [col for col in user_additional.columns 
-                                                     if col not in ['HC', 'Fecha', 'Nombre', 'Monto']]],
-                    on=['HC', 'Fecha'], 
-                    how='left'
-                )
+        for file_path, (result, error) in zip(hospital_files, results):
+            print(f"Procesando archivo de hospital: {os.path.basename(file_path)}")
+            if error is not None:
+                print(f"  Error procesando {file_path}: {str(error)}")
+                continue
             
-            # Seleccionar columnas relevantes
-            cols_to_keep = ['HC', 'Fecha', 'Nombre', 'Monto']
-            for col in ['Hora', 'Plan', 'Obra_Social']:
-                if col in extra_user.columns:
-                    cols_to_keep.append(col)
+            loaded_rows, processed_df, timings = result
+            print(f"  Cargado. Filas: {loaded_rows}")
+            print(f"  Procesado. Filas: {len(processed_df)}")
+            report.add_file(file_path, 'hospital', loaded_rows, timings)
             
-            extra_user = extra_user[[col for col in cols_to_keep if col in extra_user.columns]]
-        else:
-            extra_user = pd.DataFrame(columns=['HC', 'Fecha', 'Nombre', 'Monto'])
-        
-        # Extra en registros del hospital (en contra)
-        extra_hospital_mask = merged['_merge'] == 'right_only'
-        extra_hospital = merged[extra_hospital_mask].copy()
+            if len(processed_df) > 0:
+                hospital_dfs.append(processed_df)
         
-        print(f"Registros extra en hospital: {len(extra_hospital)}")
+        if not hospital_dfs:
+            raise Exception("No se pudieron procesar archivos del hospital")
         
-        if not extra_hospital.empty:
-            extra_hospital['Nombre'] = extra_hospital.get('Nombre_hospital', extra_hospital.get('Nombre_usuario', ''))
-            extra_hospital['Monto'] = extra_hospital.get('Monto_hospital', extra_hospital.get('Monto_usuario', 0.0))
+        with report.stage('emparejamiento', rows=len(user_df)):
+            # Combinar archivos del hospital
+            hospital_df = pd.concat(hospital_dfs, ignore_index=True)
+            print(f"Archivos de hospital combinados. Total filas: {len(hospital_df)}")
             
-            # Agregar información adicional del hospital
-            hospital_additional = hospital_df.copy()
-            if not hospital_additional.empty:
-                extra_hospital = extra_hospital.merge(
-                    hospital_additional,
-                    on=['HC', 'Fecha'], 
-                    how='left',
-                    suffixes=('', '_extra')
-                )
-            
-            # Seleccionar columnas relevantes
-            cols_to_keep = ['HC', 'Fecha', 'Nombre', 'Monto', 'Archivo_Origen', 'Tipo_Archivo']
-            for col in ['Cobertura', 'Desgrupo', 'Desc_Cob', 'Obra_Social']:
-                if col in extra_hospital.columns:
-                    cols_to_keep.append(col)
-            
-            extra_hospital = extra_hospital[[col for col in cols_to_keep if col in extra_hospital.columns]]
-        else:
-            extra_hospital = pd.DataFrame(columns=['HC', 'Fecha', 'Nombre', 'Monto', 'Archivo_Origen', 'Tipo_Archivo'])
-        
-        # Ordenar resultados
-        extra_user = extra_user.sort_values(by=['Nombre', 'Fecha']).reset_index(drop=True)
-        extra_hospital = extra_hospital.sort_values(by=['Nombre', 'Fecha']).reset_index(drop=True)
-        
-        # Crear estadísticas por historia clínica
-        user_stats = pd.DataFrame()
-        hospital_stats = pd.DataFrame()
-        
-        if not extra_user.empty:
-            user_stats = extra_user.groupby('HC').agg({
-                'Fecha': 'count',
-                'Monto': 'sum',
-                'Nombre': 'first'
-            }).rename(columns={'Fecha': 'Cantidad_Fechas'}).reset_index()
-        
-        if not extra_hospital.empty:
-            hospital_stats = extra_hospital.groupby('HC').agg({
-                'Fecha': 'count', 
-                'Monto': 'sum',
-                'Nombre': 'first'
-            }).rename(columns={'Fecha': 'Cantidad_Fechas'}).reset_index()
-        
-        # Crear resumen general
-        summary = pd.DataFrame({
-            'Concepto': [
-                'Registros en mi archivo',
-                'Registros en hospital (total)',
-                'Extra en mi registro (registros)',
-                'Extra en hospital (registros)',
-                'Extra en mi registro (pacientes únicos)',
-                'Extra en hospital (pacientes únicos)',
-                'Diferencia neta (registros)',
-                'Diferencia neta (monto)'
-            ],
-            'Cantidad': [
-                len(user_df),
-                len(hospital_df),
-                len(extra_user),
-                len(extra_hospital),
-                len(user_stats),
-                len(hospital_stats),
-                len(extra_user) - len(extra_hospital),
-                extra_user['Monto'].sum() - extra_hospital['Monto'].sum()
-            ]
-        })
+            sheets = find_discrepancies(user_df, hospital_df)
         
-        # Crear resumen por tipo de archivo del hospital
-        hospital_summary = pd.DataFrame(columns=['Tipo_Archivo', 'Cantidad_Registros', 'Monto_Total'])
-        if not extra_hospital.empty and 'Tipo_Archivo' in extra_hospital.columns:
-            hospital_summary = extra_hospital.groupby('Tipo_Archivo').agg({
-                'HC': 'count',
-                'Monto': 'sum'
-            }).reset_index()
-            hospital_summary.columns = ['Tipo_Archivo', 'Cantidad_Registros', 'Monto_Total']
-
         # Determinar ruta de salida
         if output_dir is None:
             output_dir = os.path.dirname(user_file)
         
         output_file = os.path.join(output_dir, 'discrepancias_pacientes.xlsx')
-
-        # Exportar resultados
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            # Resumen general
-            summary.to_excel(writer, sheet_name='Resumen_General', index=False)
-            
-            # Resumen por tipo de hospital
-            hospital_summary.to_excel(writer, sheet_name='Resumen_Hospital', index=False)
-            
-            # Registros extra del usuario
-            extra_user.to_excel(writer, sheet_name='Extra_Mi_Registro', index=False)
-            
-            # Registros extra del hospital
-            extra_hospital.to_excel(writer, sheet_name='Extra_Hospital', index=False)
-            
-            # Estadísticas por paciente - usuario
-            if not user_stats.empty:
-                user_stats.to_excel(writer, sheet_name='Stats_Mi_Registro', index=False)
-            
-            # Estadísticas por paciente - hospital  
-            if not hospital_stats.empty:
-                hospital_stats.to_excel(writer, sheet_name='Stats_Hospital', index=False)
-            
-            # Datos originales para referencia
-            user_df.to_excel(writer, sheet_name='Datos_Usuario', index=False)
-            hospital_df.to_excel(writer, sheet_name='Datos_Hospital', index=False)
-
+        
+        raw_data = [('Datos_Usuario', user_df), ('Datos_Hospital', hospital_df)]
+        with report.stage('escritura', output_file, rows=sum(len(df) for _, df in sheets + raw_data)):
+            write_report(output_file, sheets, raw_data, streaming_output, raw_data_sidecar)
+        report.save(os.path.splitext(output_file)[0] + '_tiempos.json')
+        
         print(f"Archivo de salida generado: {output_file}")
         return output_file
 
@@ -472,6 +697,11 @@ class ComparadorApp:
                                      command=self.process_files, style='Accent.TButton')
         self.process_btn.pack()
         
+        # Datos originales en Parquet aparte (Excel más liviano)
+        self.raw_data_sidecar = tk.BooleanVar(value=False)
+        ttk.Checkbutton(process_frame, text="Guardar los datos originales en Parquet aparte (Excel más liviano)",
+                        variable=self.raw_data_sidecar).pack(pady=(10, 0))
+        
         # Barra de progreso
         self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
         self.progress.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
@@ -488,7 +718,7 @@ class ComparadorApp:
     def select_user_file(self):
         filename = filedialog.askopenfilename(
             title="Selecciona tu archivo de registro",
-            filetypes=[("Archivos Excel", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos Excel, CSV o Parquet", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         if filename:
             self.user_file.set(filename)
@@ -497,7 +727,7 @@ class ComparadorApp:
     def select_hospital_files(self):
         filenames = filedialog.askopenfilenames(
             title="Selecciona archivos del hospital",
-            filetypes=[("Archivos Excel", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos Excel, CSV o Parquet", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         if filenames:
             for filename in filenames:
@@ -532,7 +762,8 @@ class ComparadorApp:
         
         try:
             # Procesar archivos
-            output_file = compare_records(self.user_file.get(), self.hospital_files)
+            output_file = compare_records(self.user_file.get(), self.hospital_files,
+                                          raw_data_sidecar=self.raw_data_sidecar.get())
             
             # Mostrar resultado
             messagebox.showinfo(
@@ -566,4 +797,5 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    freeze_support()  # Necesario para el pool de procesos en ejecutables (Windows)
     main()
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""Genera archivos de control y liquidaciones del hospital sintéticos para el benchmark.
+
+Uso:
+    python datos_sinteticos.py [--tamanos 1k,10k,100k,1M] [--formato xlsx|csv|parquet] [--carpeta datos_benchmark]
+
+Por cada tamaño se crea una carpeta con el archivo del usuario (control de visitas con
+columna Estado) y tres liquidaciones con los formatos de get_column_mapping (planes, pami
+y ooss). Incluye los casos que complican la conciliación: HC 'sin hc', 0 y con puntos o
+ceros adelante, montos con formato argentino, visitas repetidas el mismo día, visitas
+ausentes, presentes no pagadas y pagos del hospital sin visita del usuario.
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# Filas del archivo del usuario por tamaño
+TAMANOS = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+
+# Proporciones de la simulación
+PRESENT_RATE = 0.88        # Visitas con Estado 'P' (el resto 'A')
+PAID_RATE = 0.85           # Visitas presentes que aparecen en alguna liquidación
+EXTRA_HOSPITAL_RATE = 0.03 # Pagos del hospital sin visita del usuario
+SPECIAL_HC_RATE = 0.02     # Pacientes con HC especial ('sin hc', 0, ...)
+
+SPECIAL_HCS = ['sin hc', 'SIN H.C', 'S/HC', '0', ' 0 ', '00']
+APELLIDOS = ['GOMEZ', 'FERNANDEZ', 'RODRIGUEZ', 'LOPEZ', 'MARTINEZ', 'GARCIA', 'PEREZ', 'SANCHEZ',
+             'ROMERO', 'DIAZ', 'ALVAREZ', 'TORRES', 'RUIZ', 'RAMIREZ', 'FLORES', 'BENITEZ', 'ACOSTA']
+NOMBRES = ['MARIA', 'JUAN', 'ANA', 'CARLOS', 'LUCIA', 'JORGE', 'SOFIA', 'PABLO', 'ELENA', 'DIEGO',
+           'LAURA', 'MIGUEL', 'ROSA', 'LUIS', 'CARMEN', 'RAUL']
+PLANES = ['PLAN 210', 'PLAN 310', 'PLAN 410', 'PARTICULAR']
+OBRAS_SOCIALES = ['OSDE', 'SWISS MEDICAL', 'GALENO', 'IOMA', 'OSECAC', 'MEDIFE']
+CONSULTORIOS = ['CONSULTORIO 1', 'CONSULTORIO 2', 'CONSULTORIO 3', 'GUARDIA']
+
+# Reparto de las visitas pagadas entre las liquidaciones
+LIQUIDACIONES = {'planes': 0.40, 'pami': 0.35, 'ooss': 0.25}
+
+
+def format_money(values, rng):
+    """Montos en formato argentino, con y sin '$': '$ 12.345,67', '12.345,67' o '12345,67'."""
+    pesos = np.floor(values).astype(np.int64)
+    cents = np.round((values - pesos) * 100).astype(np.int64)
+    with_dots = pd.Series(pesos).map('{:,}'.format).str.replace(',', '.', regex=False)
+    plain = pd.Series(pesos).astype(str)
+    style = rng.integers(0, 3, len(values))
+    text = np.where(style == 2, plain, with_dots) + ',' + pd.Series(cents).map('{:02d}'.format)
+    return pd.Series(np.where(style == 0, '$ ' + text, text))
+
+
+def make_patients(count, rng):
+    """Pacientes con HC numérica, cómo la escribe el usuario y nombre."""
+    hc = rng.choice(np.arange(1000, 1000 + count * 20), count, replace=False)
+    user_hc = pd.Series(hc.astype(str))
+
+    # Variantes de escritura del usuario: con puntos de miles o con ceros adelante
+    variant = rng.random(count)
+    user_hc = user_hc.where(variant > 0.05, pd.Series(hc).map('{:,}'.format).str.replace(',', '.', regex=False))
+    user_hc = user_hc.where((variant <= 0.05) | (variant > 0.08), '00' + user_hc)
+
+    # HC especiales: el hospital las liquida con el mismo texto
+    special = rng.random(count) < SPECIAL_HC_RATE
+    special_values = rng.choice(SPECIAL_HCS, count)
+    user_hc = user_hc.where(~special, special_values)
+    hospital_hc = pd.Series(hc.astype(object)).where(~special, special_values)
+
+    names = (pd.Series(rng.choice(APELLIDOS, count)) + ', ' + pd.Series(rng.choice(NOMBRES, count))
+             + ' ' + pd.Series(rng.integers(1, 99, count)).astype(str))
+    return pd.DataFrame({'user_hc': user_hc, 'hospital_hc': hospital_hc, 'name': names})
+
+
+def generate_dataset(rows, seed=0):
+    """Devuelve (usuario, {tipo: liquidación}) como DataFrames para `rows` visitas del usuario."""
+    rng = np.random.default_rng(seed)
+    patients = make_patients(max(50, rows // 6), rng)
+
+    # Visitas del usuario: un mes de atención, con repetidas el mismo día
+    patient = rng.integers(0, len(patients), rows)
+    dates = pd.Timestamp('2025-03-01') + pd.to_timedelta(rng.integers(0, 31, rows), unit='D')
+    amounts = rng.integers(5_000, 90_000, rows) + rng.integers(0, 100, rows) / 100
+    state = np.where(rng.random(rows) < PRESENT_RATE, 'P', 'A')
+    state = np.where((state == 'P') & (rng.random(rows) < 0.03), 'p', state)
+
+    user = pd.DataFrame({
+        'HC': patients['user_hc'].to_numpy()[patient],
+        'Paciente': patients['name'].to_numpy()[patient],
+        'Fecha': dates.strftime('%d/%m/%Y'),
+        'Hora': pd.Series(rng.integers(8, 20, rows)).map('{:02d}'.format) + ':'
+                + pd.Series(rng.choice([0, 15, 30, 45], rows)).map('{:02d}'.format),
+        'Monto': format_money(amounts, rng),
+        'Plan': rng.choice(PLANES, rows),
+        'Obra_Social': rng.choice(OBRAS_SOCIALES, rows),
+        'Consultorio': rng.choice(CONSULTORIOS, rows),
+        'Estado': state,
+    })
+
+    # Visitas presentes pagadas + pagos del hospital sin visita del usuario
+    paid = np.flatnonzero((np.char.upper(state.astype(str)) == 'P') & (rng.random(rows) < PAID_RATE))
+    extra = int(rows * EXTRA_HOSPITAL_RATE)
+    hospital_patient = np.concatenate([patient[paid], rng.integers(0, len(patients), extra)])
+    hospital_dates = np.concatenate([dates[paid].to_numpy(),
+                                     (pd.Timestamp('2025-03-01')
+                                      + pd.to_timedelta(rng.integers(0, 31, extra), unit='D')).to_numpy()])
+    hospital_amounts = np.concatenate([amounts[paid], rng.integers(5_000, 90_000, extra).astype(float)])
+    hospital = pd.DataFrame({
+        'HC': patients['hospital_hc'].to_numpy()[hospital_patient],
+        'Nombre': patients['name'].to_numpy()[hospital_patient],
+        'Fecha': hospital_dates,
+        'Monto': hospital_amounts,
+    }).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    # Repartir entre liquidaciones con los nombres de columna de cada tipo
+    kind = rng.choice(list(LIQUIDACIONES), len(hospital), p=list(LIQUIDACIONES.values()))
+    liquidations = {}
+    for file_type in LIQUIDACIONES:
+        part = hospital[kind == file_type].reset_index(drop=True)
+        n = len(part)
+        if file_type == 'planes':
+            liquidations[file_type] = pd.DataFrame({
+                'HC': part['HC'], 'Nombre': part['Nombre'], 'Fecha': part['Fecha'],
+                'Hono_Impu1': part['Monto'], 'Cobertura': rng.choice(PLANES, n)})
+        elif file_type == 'pami':
+            liquidations[file_type] = pd.DataFrame({
+                'HC': part['HC'], 'Nombre': part['Nombre'], 'Fecha': part['Fecha'].dt.strftime('%d/%m/%Y'),
+                'hono_impu1': format_money(part['Monto'].to_numpy(), rng),
+                'DesGrupo': rng.choice(['CONSULTAS', 'PRACTICAS'], n), 'Desc_Cob': 'PAMI'})
+        else:
+            liquidations[file_type] = pd.DataFrame({
+                'Historia': part['HC'], 'Nombre': part['Nombre'], 'Fecha': part['Fecha'],
+                'Honorarios': part['Monto'], 'Desc_Cob': 'OOSS',
+                'Obra_Social': rng.choice(OBRAS_SOCIALES, n)})
+    return user, liquidations
+
+
+def write_table(df, path_without_extension, file_format):
+    """Guarda el DataFrame en el formato pedido y devuelve la ruta."""
+    if file_format == 'csv':
+        path = path_without_extension + '.csv'
+        df.to_csv(path, sep=';', index=False, encoding='utf-8-sig')
+    elif file_format == 'parquet':
+        path = path_without_extension + '.parquet'
+        df.astype({col: str for col in df.columns if df[col].dtype == object}).to_parquet(path, index=False)
+    else:
+        from comprar_pacientes import write_excel_streaming
+        path = path_without_extension + '.xlsx'
+        write_excel_streaming(path, [('Hoja1', df)])
+    return path
+
+
+def dataset_paths(folder, size, file_format='xlsx'):
+    """Rutas del conjunto de un tamaño: (archivo del usuario, [liquidaciones])."""
+    extension = {'xlsx': '.xlsx', 'csv': '.csv', 'parquet': '.parquet'}[file_format]
+    base = os.path.join(folder, f'{size}_{file_format}')
+    return (os.path.join(base, f'usuario_{size}{extension}'),
+            [os.path.join(base, f'liquidacion_{file_type}_{size}{extension}') for file_type in LIQUIDACIONES])
+
+
+def ensure_dataset(folder, size, file_format='xlsx', seed=0, force=False):
+    """Genera el conjunto de un tamaño si todavía no existe y devuelve sus rutas."""
+    user_file, hospital_files = dataset_paths(folder, size, file_format)
+    if force or not all(os.path.exists(path) for path in [user_file] + hospital_files):
+        os.makedirs(os.path.dirname(user_file), exist_ok=True)
+        user, liquidations = generate_dataset(TAMANOS[size], seed)
+        write_table(user, os.path.splitext(user_file)[0], file_format)
+        for path, df in zip(hospital_files, liquidations.values()):
+            write_table(df, os.path.splitext(path)[0], file_format)
+    return user_file, hospital_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos de control y liquidaciones")
+    parser.add_argument('--tamanos', default=','.join(TAMANOS),
+                        help="Tamaños separados por coma (%(default)s)")
+    parser.add_argument('--formato', default='xlsx', choices=['xlsx', 'csv', 'parquet'])
+    parser.add_argument('--carpeta', default='datos_benchmark')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--regenerar', action='store_true', help="Vuelve a generar aunque ya existan")
+    args = parser.parse_args()
+
+    for size in args.tamanos.split(','):
+        user_file, hospital_files = ensure_dataset(args.carpeta, size.strip(), args.formato,
+                                                   args.semilla, args.regenerar)
+        print(f"{size}: {user_file}")
+        for path in hospital_files:
+            print(f"      {path}")
+
+
+if __name__ == "__main__":
+    main()
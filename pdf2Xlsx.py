@@ -1,99 +1,357 @@
 import sys
 import os
-import tkinter as tk
-from tkinter import filedialog, messagebox, Listbox, Scrollbar
-import pdfplumber
-import pandas as pd
+import time
 
-def convert_pdf_to_excel(pdf_path):
-    all_tables = []
+# tkinter, pdfplumber y openpyxl se importan recién cuando se usan:
+# el modo CLI (cron, servidores sin pantalla) nunca carga tkinter ni construye la ventana
+
+# Páginas mínimas por tarea al repartir un PDF entre procesos
+MIN_PAGES_PER_TASK = 5
+
+# Filas por hoja que admite Excel (con el encabezado); una tabla más larga sigue en otra hoja
+EXCEL_MAX_ROWS = 1048576
+
+def may_contain_table(page):
+    """
+    Chequeo rápido antes de buscar tablas: extract_tables() arma las celdas con las líneas dibujadas,
+    así que una página sin texto o sin al menos dos bordes horizontales y dos verticales
+    (portadas, páginas de totales o de solo texto) no puede tener una tabla con datos
+    """
+    objects = page.objects
+    if not objects.get('char'):
+        return False
+    if objects.get('curve'):
+        return True  # Curvas: se deja que decida la búsqueda completa
+
+    horizontal = vertical = 0
+    for line in objects.get('line', []):
+        if abs(line['top'] - line['bottom']) < 1:
+            horizontal += 1
+        elif abs(line['x0'] - line['x1']) < 1:
+            vertical += 1
+    for rect in objects.get('rect', []):
+        if rect['height'] <= 1:
+            horizontal += 1
+        elif rect['width'] <= 1:
+            vertical += 1
+        else:
+            horizontal += 2
+            vertical += 2
+    return horizontal >= 2 and vertical >= 2
+
+def extract_page_range(page_range, pdf_path, full_scan=False):
+    """
+    Extrae las tablas de las páginas [inicio, fin) con su propio manejador del PDF (corre en un worker)
+    Las páginas descartadas por may_contain_table quedan con tablas None, salvo con full_scan
+    """
+    import pdfplumber
+
+    start, end = page_range
+    page_tables = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_number in range(start, end):
+            page = pdf.pages[page_number]
+            if full_scan or may_contain_table(page):
+                page_tables.append((page_number + 1, page.extract_tables()))
+            else:
+                page_tables.append((page_number + 1, None))
+            page.close()  # Libera los objetos ya analizados de la página
+    return page_tables
+
+def split_pages(page_count, workers):
+    """Reparte las páginas en rangos contiguos, unos cuantos por worker para equilibrar la carga"""
+    size = max(MIN_PAGES_PER_TASK, -(-page_count // (workers * 4)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+def extract_tables_parallel(pdf_path, max_workers=None, full_scan=False):
+    """Devuelve [(número de página, tablas)] en orden de página, repartiendo las páginas en un pool de procesos"""
+    import pdfplumber
+    from carga_paralela import map_files, WORKERS
+
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+
+    page_tables = []
+    for result, error in map_files(extract_page_range, split_pages(page_count, max_workers or WORKERS),
+                                   pdf_path, full_scan, max_workers=max_workers):
+        if error is not None:
+            raise error
+        page_tables.extend(result)
+    return page_tables
+
+def header_key(row):
+    """Encabezado normalizado para reconocer el mismo encabezado repetido en otra página"""
+    return tuple(' '.join(str(cell).split()) if cell is not None else '' for cell in row)
+
+def stitch_tables(page_tables):
+    """
+    Une las tablas que continúan de una página a otra: la primera tabla de la página siguiente a la
+    última de la tabla en curso se agrega a esa tabla si tiene el mismo encabezado (no se repite) o la
+    misma cantidad de columnas (continuación sin encabezado); cualquier otra tabla, incluidas las
+    demás de una misma página, empieza una tabla nueva
+    Genera (índice de tabla, encabezado, número de página, filas) a medida que recorre las páginas
+    """
+    table_index = 0
+    header = None
+    last_page = None
+    for page_number, tables in page_tables:
+        first_on_page = True
+        for table in tables or []:
+            if not table:  # Asegura que la tabla no esté vacía
+                continue
+            continues = header is not None and first_on_page and page_number == last_page + 1
+            first_on_page = False
+            if continues and header_key(table[0]) == header_key(header):
+                rows = table[1:]  # Encabezado repetido en la página siguiente
+            elif continues and len(table[0]) == len(header):
+                rows = table  # Continuación sin encabezado: la primera fila ya es de datos
+            else:
+                # Tabla nueva: asume que la primera fila es el encabezado
+                table_index += 1
+                header = table[0]
+                rows = table[1:]
+            last_page = page_number
+            yield table_index, header, page_number, rows
+
+def convert_pdf_to_excel(pdf_path, max_workers=None, full_scan=False):
+    from openpyxl import Workbook
+
+    page_tables = extract_tables_parallel(pdf_path, max_workers, full_scan)
+    skipped = sum(1 for _, tables in page_tables if tables is None)
+    skipped_note = f" - {skipped} páginas sin tablas omitidas" if skipped else ""
+
+    # Escritura en streaming (write_only): cada fila va directo al archivo, la memoria no crece con el PDF
+    workbook = Workbook(write_only=True)
+    sheets = {}  # índice de tabla -> [hoja, filas escritas, parte]
+    total_rows = 0
+    for table_index, header, page_number, rows in stitch_tables(page_tables):
+        for row in rows:
+            current = sheets.get(table_index)
+            # openpyxl en modo write_only no controla el límite de filas: el archivo quedaría inválido
+            if current is None or current[1] == EXCEL_MAX_ROWS:
+                part = 1 if current is None else current[2] + 1
+                title = f'Tabla_{table_index}' if part == 1 else f'Tabla_{table_index}_{part}'
+                current = sheets[table_index] = [workbook.create_sheet(title=title), 1, part]
+                current[0].append(list(header) + ['Pagina_Origen'])
+            current[0].append(list(row) + [page_number])
+            current[1] += 1
+        if table_index not in sheets:  # Tabla con encabezado y sin filas
+            sheets[table_index] = [workbook.create_sheet(title=f'Tabla_{table_index}'), 1, 1]
+            sheets[table_index][0].append(list(header) + ['Pagina_Origen'])
+        total_rows += len(rows)
+
+    if sheets:
+        excel_path = os.path.splitext(pdf_path)[0] + '.xlsx'
+        workbook.save(excel_path)
+        return f"Convertido {pdf_path} a {excel_path} ({len(sheets)} tablas, {total_rows} filas){skipped_note}"
+    else:
+        workbook.close()
+        return f"No se encontraron tablas en {pdf_path}{skipped_note}"
+
+def convert_pdf_timed(pdf_path, full_scan=False, max_workers=None):
+    """Convierte un PDF y devuelve (mensaje, páginas, segundos); es lo que corre cada worker de un lote"""
+    import pdfplumber
+
+    start = time.perf_counter()
+    message = convert_pdf_to_excel(pdf_path, max_workers, full_scan)
     with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            for table in tables:
-                if table:  # Asegura que la tabla no esté vacía
-                    # Asume que la primera fila es el encabezado
-                    df = pd.DataFrame(table[1:], columns=table[0])
-                    all_tables.append(df)
-    
-    if all_tables:
-        excel_path = pdf_path.replace('.pdf', '.xlsx')
-        with pd.ExcelWriter(excel_path) as writer:
-            for i, df in enumerate(all_tables):
-                df.to_excel(writer, sheet_name=f'Tabla_{i+1}', index=False)
-        return f"Convertido {pdf_path} a {excel_path}"
+        page_count = len(pdf.pages)
+    return message, page_count, time.perf_counter() - start
+
+def expand_pdf_paths(paths):
+    """Expande las carpetas a los PDF que contienen (ordenados por nombre); los archivos quedan igual"""
+    pdf_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            pdf_files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                             if name.lower().endswith('.pdf'))
+        else:
+            pdf_files.append(path)
+    return pdf_files
+
+def run_cli(args):
+    """
+    Modo CLI: convierte los PDF y carpetas indicados; devuelve 1 si algún archivo falló
+    Con --full-scan se buscan tablas en todas las páginas, sin el prefiltro
+    """
+    full_scan = '--full-scan' in args
+    pdf_files = expand_pdf_paths([arg for arg in args if arg != '--full-scan'])
+    if not pdf_files:
+        print("No se encontraron archivos PDF")
+        return 1
+
+    failed = 0
+    for pdf_file in pdf_files:
+        try:
+            print(convert_pdf_to_excel(pdf_file, full_scan=full_scan))
+        except Exception as e:
+            failed += 1
+            print(f"Error convirtiendo {pdf_file}: {str(e)}", file=sys.stderr)
+    return 1 if failed else 0
+
+def run_gui():
+    import threading
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, Listbox, Scrollbar
+    from carga_paralela import iter_files
+
+    selected_files = []
+    cancel_event = threading.Event()
+
+    def set_entry(index, text):
+        file_list.delete(index)
+        file_list.insert(index, text)
+
+    def select_files():
+        files = filedialog.askopenfilenames(
+            title="Seleccionar Archivos PDF",
+            filetypes=[("Archivos PDF", "*.pdf")]
+        )
+        if files:
+            selected_files[:] = files
+            file_list.delete(0, tk.END)
+            for file in files:
+                file_list.insert(tk.END, file)
+            status_label.config(text=f"{len(files)} archivos seleccionados.")
+
+    def convert_files():
+        files = list(selected_files)
+        if not files:
+            messagebox.showwarning("Sin Archivos", "Por favor, selecciona archivos PDF primero.")
+            return
+
+        cancel_event.clear()
+        select_button.config(state=tk.DISABLED)
+        convert_button.config(state=tk.DISABLED)
+        cancel_button.config(state=tk.NORMAL)
+        for i, pdf_file in enumerate(files):
+            set_entry(i, f"En cola: {os.path.basename(pdf_file)}")
+        status_label.config(text=f"Convirtiendo 0/{len(files)}...")
+
+        # La conversión corre en segundo plano para no congelar la ventana
+        thread = threading.Thread(target=run_batch, args=(files, full_scan_var.get()), daemon=True)
+        thread.start()
+
+    def run_batch(files, full_scan):
+        """Convierte el lote en un pool de procesos (un PDF por worker) y avisa a la ventana con cada resultado
+
+        Si el pool se rompe (por ejemplo un worker que se quedó sin memoria con un PDF grande) el lote
+        se corta, pero la ventana siempre se rehabilita y muestra el error.
+        """
+        start = time.perf_counter()
+        # Con un solo PDF se reparten sus páginas; con varios, cada worker convierte un PDF completo
+        page_workers = None if len(files) == 1 else 1
+        results = [None] * len(files)
+        batch_error = None
+        done = 0
+        try:
+            for i, result, error in iter_files(convert_pdf_timed, files, full_scan, page_workers,
+                                               cancel_event=cancel_event):
+                done += 1
+                results[i] = f"Error convirtiendo {files[i]}: {str(error)}" if error is not None else result[0]
+                root.after(0, lambda i=i, result=result, error=error, done=done, elapsed=time.perf_counter() - start:
+                           show_result(files, i, result, error, done, elapsed))
+        except Exception as e:
+            batch_error = f"{type(e).__name__}: {str(e)}"
+        finally:
+            elapsed = time.perf_counter() - start
+            root.after(0, lambda: finish_batch(files, results, elapsed, batch_error))
+
+    def show_result(files, index, result, error, done, elapsed):
+        name = os.path.basename(files[index])
+        if error is not None:
+            set_entry(index, f"Error: {name} - {str(error)}")
+        else:
+            message, page_count, seconds = result
+            set_entry(index, f"Listo: {name} - {page_count} páginas en {seconds:.1f} s "
+                             f"({page_count / max(seconds, 1e-9):.1f} págs/s)")
+        status_label.config(text=f"Convirtiendo {done}/{len(files)}... ({elapsed:.0f} s)")
+
+    def finish_batch(files, results, elapsed, batch_error=None):
+        pending_label = "Sin convertir" if batch_error else "Cancelado"
+        for i, result in enumerate(results):
+            if result is None:
+                set_entry(i, f"{pending_label}: {os.path.basename(files[i])}")
+        converted = sum(1 for result in results if result is not None)
+        summary = "\n".join(result for result in results if result is not None)
+
+        select_button.config(state=tk.NORMAL)
+        convert_button.config(state=tk.NORMAL)
+        cancel_button.config(state=tk.DISABLED)
+        if batch_error:
+            status_label.config(text=f"Conversión interrumpida: {converted}/{len(files)} archivos en {elapsed:.1f} s.")
+            messagebox.showerror("Error en la Conversión",
+                                 f"La conversión se interrumpió: {batch_error}\n\n{summary}".rstrip())
+        elif cancel_event.is_set():
+            status_label.config(text=f"Conversión cancelada: {converted}/{len(files)} archivos en {elapsed:.1f} s.")
+            messagebox.showinfo("Conversión Cancelada", summary or "No se convirtió ningún archivo.")
+        else:
+            status_label.config(text=f"Conversión completada en {elapsed:.1f} s. Listo para nuevos archivos.")
+            messagebox.showinfo("Conversión Completada", summary)
+
+    def cancel_conversion():
+        # Los PDF que ya se están convirtiendo terminan; los que siguen en cola no se procesan
+        cancel_event.set()
+        cancel_button.config(state=tk.DISABLED)
+        status_label.config(text="Cancelando... se terminan los archivos en curso.")
+
+    # Configuración de la GUI
+    root = tk.Tk()
+    root.title("Convertidor de PDF a Excel")
+    root.geometry("600x460")
+
+    # Instrucciones
+    instructions = tk.Label(root, text="¡Bienvenido! Esta herramienta convierte archivos PDF a Excel.\n"
+                                       "1. Haz clic en 'Seleccionar PDFs' para elegir tus archivos.\n"
+                                       "2. Los archivos seleccionados aparecerán en la lista abajo.\n"
+                                       "3. Haz clic en 'Convertir' para procesarlos.\n"
+                                       "Cada PDF se convertirá en un archivo Excel separado en el mismo directorio.",
+                            justify=tk.LEFT, padx=10, pady=10)
+    instructions.pack(anchor=tk.W)
+
+    # Botón de selección de archivos
+    select_button = tk.Button(root, text="Seleccionar PDFs", command=select_files)
+    select_button.pack(pady=10)
+
+    # Lista de archivos
+    frame = tk.Frame(root)
+    frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    scrollbar = Scrollbar(frame)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    file_list = Listbox(frame, yscrollcommand=scrollbar.set)
+    file_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    scrollbar.config(command=file_list.yview)
+
+    # Botón de conversión
+    convert_button = tk.Button(root, text="Convertir", command=convert_files)
+    convert_button.pack(pady=10)
+
+    # Botón para cancelar el lote en curso
+    cancel_button = tk.Button(root, text="Cancelar", command=cancel_conversion, state=tk.DISABLED)
+    cancel_button.pack()
+
+    # Forzar la búsqueda de tablas en todas las páginas (sin el prefiltro)
+    full_scan_var = tk.BooleanVar(value=False)
+    full_scan_check = tk.Checkbutton(root, text="Analizar todas las páginas", variable=full_scan_var)
+    full_scan_check.pack()
+
+    # Etiqueta de estado
+    status_label = tk.Label(root, text="Aún no se han seleccionado archivos.")
+    status_label.pack(pady=10)
+
+    root.mainloop()
+
+if __name__ == "__main__":
+    from multiprocessing import freeze_support
+    freeze_support()
+
+    # Verificar si se ejecuta desde línea de comandos con argumentos (archivos PDF o carpetas)
+    if len(sys.argv) > 1 and sys.argv[1] != '':
+        # Modo CLI
+        sys.exit(run_cli(sys.argv[1:]))
     else:
-        return f"No se encontraron tablas en {pdf_path}"
-
-def select_files():
-    files = filedialog.askopenfilenames(
-        title="Seleccionar Archivos PDF",
-        filetypes=[("Archivos PDF", "*.pdf")]
-    )
-    if files:
-        file_list.delete(0, tk.END)
-        for file in files:
-            file_list.insert(tk.END, file)
-        status_label.config(text=f"{len(files)} archivos seleccionados.")
-
-def convert_files():
-    files = file_list.get(0, tk.END)
-    if not files:
-        messagebox.showwarning("Sin Archivos", "Por favor, selecciona archivos PDF primero.")
-        return
-    
-    results = []
-    for pdf_file in files:
-        result = convert_pdf_to_excel(pdf_file)
-        results.append(result)
-    
-    messagebox.showinfo("Conversión Completada", "\n".join(results))
-    status_label.config(text="Conversión completada. Listo para nuevos archivos.")
-    file_list.delete(0, tk.END)
-
-# Configuración de la GUI
-root = tk.Tk()
-root.title("Convertidor de PDF a Excel")
-root.geometry("600x400")
-
-# Instrucciones
-instructions = tk.Label(root, text="¡Bienvenido! Esta herramienta convierte archivos PDF a Excel.\n"
-                                   "1. Haz clic en 'Seleccionar PDFs' para elegir tus archivos.\n"
-                                   "2. Los archivos seleccionados aparecerán en la lista abajo.\n"
-                                   "3. Haz clic en 'Convertir' para procesarlos.\n"
-                                   "Cada PDF se convertirá en un archivo Excel separado en el mismo directorio.",
-                        justify=tk.LEFT, padx=10, pady=10)
-instructions.pack(anchor=tk.W)
-
-# Botón de selección de archivos
-select_button = tk.Button(root, text="Seleccionar PDFs", command=select_files)
-select_button.pack(pady=10)
-
-# Lista de archivos
-frame = tk.Frame(root)
-frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-scrollbar = Scrollbar(frame)
-scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-file_list = Listbox(frame, yscrollcommand=scrollbar.set)
-file_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-scrollbar.config(command=file_list.yview)
-
-# Botón de conversión
-convert_button = tk.Button(root, text="Convertir", command=convert_files)
-convert_button.pack(pady=10)
-
-# Etiqueta de estado
-status_label = tk.Label(root, text="Aún no se han seleccionado archivos.")
-status_label.pack(pady=10)
-
-# Verificar si se ejecuta desde línea de comandos con argumentos
-if len(sys.argv) > 1 and sys.argv[1] != '':
-    # Modo CLI
-    for pdf_file in sys.argv[1:]:
-        print(convert_pdf_to_excel(pdf_file))
-else:
-    # Modo GUI
-    root.mainloop()
\ No newline at end of file
+        # Modo GUI
+        run_gui()
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import os
 import re
 from pathlib import Path
@@ -8,6 +9,10 @@ import subprocess
 import sys
 import threading
 from datetime import datetime
+from cache_excel import read_excel_cached, read_excel_header, should_stream, iter_excel_batches, excel_engine, reader_used
+from carga_paralela import map_files
+from tiempos import StageTimer, RunReport
+from multiprocessing import freeze_support
 
 class HistoriaClinicaProcessor:
     def __init__(self):
@@ -17,6 +22,16 @@ class HistoriaClinicaProcessor:
         self.df_pagos_en_contra = None  
         self.archivo_salida = "presentes_no_pagados.xlsx"
         self.archivo_salida_contra = "pagos_en_contra.xlsx"
+        self.max_workers = None  # Procesos para cargar archivos del hospital (None = GUITA_ZOKO_WORKERS)
+        
+        # Libro de conciliación: guarda lo ya procesado de cada archivo entre corridas
+        self.archivo_libro = "libro_conciliacion.pkl"
+        self.usar_libro = False
+        self.libro = None
+        
+        # Tiempos por etapa de la corrida (se guardan en JSON al terminar guardar_resultados)
+        self.archivo_tiempos = "reporte_tiempos.json"
+        self.tiempos = RunReport('multiple')
         
     def normalizar_hc(self, valor):
         """
@@ -49,6 +64,70 @@ class HistoriaClinicaProcessor:
         
         return None
     
+    def normalizar_columna_hc(self, serie):
+        """
+        Versión vectorizada de normalizar_hc para una columna completa
+        Normaliza cada texto distinto una sola vez y expande el resultado a todas las filas
+        Devuelve un DataFrame compacto con el mismo índice:
+        - HC_NUM: HC numérica como int64 (0 si la HC es especial o inválida)
+        - HC_ESPECIAL: clave SIN_HC_/HC_0_/ESPECIAL_ (None si la HC es numérica o inválida)
+        """
+        validos = serie.notna().to_numpy()
+        
+        # Convertir a string (igual que str(valor)) y agrupar valores repetidos
+        codigos, unicos = pd.factorize(serie[validos].astype(str))
+        valor_str = pd.Series(unicos, dtype=object).str.strip().str.lower()
+        sufijo = valor_str.str.replace(' ', '_', regex=False)
+        
+        num_unicos = np.zeros(len(valor_str), dtype='int64')
+        especial_unicos = np.full(len(valor_str), None, dtype=object)
+        
+        # Pacientes sin HC
+        sin_hc = np.zeros(len(valor_str), dtype=bool)
+        for palabra in ['sin h.c', 'sin hc', 'sin historia']:
+            sin_hc |= valor_str.str.contains(palabra, regex=False).to_numpy(dtype=bool)
+        especial_unicos[sin_hc] = ('SIN_HC_' + sufijo[sin_hc]).to_numpy()
+        
+        # Extraer el primer número de la cadena
+        numeros = valor_str.str.extract(r'(\d+)', expand=False)
+        numeros[sin_hc] = np.nan
+        con_numero = numeros.dropna()
+        
+        # Números que no entran en int64 o con dígitos no ASCII: se normalizan celda por celda
+        celda_a_celda = (con_numero.str.len() > 18) | ~con_numero.str.fullmatch(r'[0-9]+')
+        for pos in con_numero.index[celda_a_celda.to_numpy(dtype=bool)]:
+            especial_unicos[pos] = self.normalizar_hc(unicos[pos])
+        numero = pd.to_numeric(con_numero[~celda_a_celda]).astype('int64')
+        
+        # Manejar HC = 0 como caso especial
+        ceros = numero.index[numero.to_numpy() == 0]
+        especial_unicos[ceros] = ('HC_0_' + sufijo[ceros]).to_numpy()
+        no_ceros = numero[numero != 0]
+        num_unicos[no_ceros.index] = no_ceros.to_numpy()
+        
+        # Si no hay números pero hay contenido, tratarlo como caso especial
+        especiales = ~sin_hc & numeros.isna().to_numpy() & (valor_str != '').to_numpy()
+        especial_unicos[especiales] = ('ESPECIAL_' + sufijo[especiales]).to_numpy()
+        
+        # Expandir de valores únicos a filas
+        hc_num = np.zeros(len(serie), dtype='int64')
+        hc_especial = np.full(len(serie), None, dtype=object)
+        hc_num[validos] = num_unicos[codigos]
+        hc_especial[validos] = especial_unicos[codigos]
+        
+        return pd.DataFrame({'HC_NUM': hc_num, 'HC_ESPECIAL': hc_especial}, index=serie.index)
+    
+    def claves_hc(self, hc_compacta):
+        """
+        Combina HC_NUM y HC_ESPECIAL en una sola clave por fila, igual a la de normalizar_hc
+        (int para HC numéricas, string para casos especiales, None para HC inválidas)
+        """
+        claves = hc_compacta['HC_ESPECIAL'].astype(object)
+        claves = claves.where(claves.notna(), None)
+        numericas = hc_compacta['HC_NUM'] > 0
+        claves[numericas] = hc_compacta['HC_NUM'][numericas].astype(object)
+        return claves
+    
     def encontrar_columna_hc(self, df):
         """
         Encuentra la columna que contiene las historias clínicas
@@ -88,55 +167,45 @@ class HistoriaClinicaProcessor:
         Cada fila representa una visita independiente que debe ser pagada
         """
         try:
+            self.tiempos = RunReport('multiple', log=callback)
             if callback:
+                callback(f"Lector de Excel configurado: {excel_engine()}")
                 callback(f"Procesando {len(self.archivos_control)} archivos de control...")
             
             df_todos_presentes = []
             
+            self.libro = self.cargar_libro(callback) if self.usar_libro else None
+            
             for archivo in self.archivos_control:
                 if callback:
                     callback(f"Procesando: {os.path.basename(archivo)}")
                 
-                df = pd.read_excel(archivo)
-                
-                # Encontrar columnas relevantes
-                col_hc = self.encontrar_columna_hc(df)
-                col_estado = self.encontrar_columna_estado(df)
-                
-                if not col_hc:
+                # Sin cambios desde la corrida anterior: se usa lo guardado en el libro
+                if self.en_libro('control', archivo):
+                    df_filtrado = self.libro['control'][os.path.abspath(archivo)]['df']
                     if callback:
-                        callback(f"❌ No se encontró columna HC en {os.path.basename(archivo)}")
+                        callback(f"♻️  Sin cambios, se reutiliza del libro: {len(df_filtrado)} registros presentes")
+                    df_todos_presentes.append(df_filtrado)
                     continue
-                if not col_estado:
-                    if callback:
-                        callback(f"❌ No se encontró columna Estado en {os.path.basename(archivo)}")
-                    continue
-                
-                # Filtrar solo los presentes
-                df_filtrado = df[df[col_estado].str.upper() == 'P'].copy()
-                
-                # Normalizar HC para comparar
-                df_filtrado['HC_NORMALIZADA'] = df_filtrado[col_hc].apply(self.normalizar_hc)
                 
-                # Agregar identificador de archivo y fila única
-                df_filtrado['ARCHIVO_ORIGEN'] = os.path.basename(archivo)
-                df_filtrado['ID_FILA'] = (os.path.basename(archivo) + '_' + 
-                                        df_filtrado.index.astype(str) + '_' + 
-                                        df_filtrado['HC_NORMALIZADA'].astype(str))
-                
-                # Eliminar filas donde no se pudo normalizar la HC
-                antes_filtro = len(df_filtrado)
-                df_filtrado = df_filtrado.dropna(subset=['HC_NORMALIZADA'])
-                despues_filtro = len(df_filtrado)
+                df_filtrado = self.extraer_presentes(archivo, callback)
+                if df_filtrado is None:
+                    # Lo guardado de una versión anterior del archivo ya no vale
+                    if self.libro is not None:
+                        self.quitar_del_libro('control', archivo, callback)
+                    continue
                 
-                if antes_filtro != despues_filtro:
-                    if callback:
-                        callback(f"⚠️  {antes_filtro - despues_filtro} filas eliminadas por HC inválida")
+                if self.libro is not None:
+                    self.registrar_en_libro('control', archivo, df_filtrado, callback=callback)
                 
                 df_todos_presentes.append(df_filtrado)
                 if callback:
                     callback(f"✅ {len(df_filtrado)} registros presentes")
             
+            # Con el libro se concilian también los meses de corridas anteriores
+            if self.libro is not None:
+                df_todos_presentes = self.frames_del_libro('control', self.archivos_control, callback)
+            
             # Combinar todos los archivos
             if df_todos_presentes:
                 self.df_presentes = pd.concat(df_todos_presentes, ignore_index=True)
@@ -166,6 +235,177 @@ class HistoriaClinicaProcessor:
                 callback(f"Error procesando archivos de control: {str(e)}")
             return False
     
+    def extraer_presentes(self, archivo, callback=None):
+        """
+        Lee un archivo de control y devuelve solo las visitas presentes con HC válida,
+        con HC_NORMALIZADA, ARCHIVO_ORIGEN e ID_FILA (None si faltan columnas)
+        """
+        # Encontrar columnas relevantes (solo con el encabezado)
+        with self.tiempos.stage('deteccion_columnas', archivo):
+            encabezado = read_excel_header(archivo)
+            col_hc = self.encontrar_columna_hc(encabezado)
+            col_estado = self.encontrar_columna_estado(encabezado)
+        
+        if not col_hc:
+            if callback:
+                callback(f"❌ No se encontró columna HC en {os.path.basename(archivo)}")
+            return None
+        if not col_estado:
+            if callback:
+                callback(f"❌ No se encontró columna Estado en {os.path.basename(archivo)}")
+            return None
+        
+        # Se guardan todas las columnas en la salida; Estado se lee sin conversión
+        with self.tiempos.stage('carga', archivo) as etapa:
+            df = read_excel_cached(archivo, dtype={col_estado: object})
+            etapa['filas'] = len(df)
+        columnas_originales = list(df.columns)
+        self.tiempos.add_file(archivo, 'control', len(df), reader=reader_used(archivo))
+        
+        with self.tiempos.stage('normalizacion', archivo, rows=len(df)):
+            # Filtrar solo los presentes
+            df_filtrado = df[df[col_estado].str.upper() == 'P'].copy()
+            
+            # Normalizar HC para comparar
+            df_filtrado['HC_NORMALIZADA'] = self.claves_hc(self.normalizar_columna_hc(df_filtrado[col_hc]))
+            
+            # Agregar identificador de archivo y fila única (por ruta completa: dos control.xlsx
+            # de carpetas distintas no comparten identificadores)
+            df_filtrado['ARCHIVO_ORIGEN'] = os.path.basename(archivo)
+            df_filtrado['ID_FILA'] = (os.path.abspath(archivo) + '_' + 
+                                    df_filtrado.index.astype(str) + '_' + 
+                                    df_filtrado['HC_NORMALIZADA'].astype(str))
+            
+            # Eliminar filas donde no se pudo normalizar la HC
+            antes_filtro = len(df_filtrado)
+            df_filtrado = df_filtrado.dropna(subset=['HC_NORMALIZADA'])
+            despues_filtro = len(df_filtrado)
+        
+        if antes_filtro != despues_filtro:
+            if callback:
+                callback(f"⚠️  {antes_filtro - despues_filtro} filas eliminadas por HC inválida")
+        
+        # Con el libro, cada visita lleva su clave estable
+        if self.libro is not None:
+            df_filtrado['HASH_VISITA'] = self.hash_visitas(df_filtrado, columnas_originales)
+        return df_filtrado
+    
+    def hash_visitas(self, df, columnas):
+        """
+        Clave estable de cada visita: hash del contenido de la fila y de su HC normalizada,
+        más el número de repetición para distinguir filas idénticas del mismo archivo
+        No depende de la posición de la fila, así que sobrevive a reordenamientos y reexportaciones
+        """
+        contenido = pd.util.hash_pandas_object(df[columnas + ['HC_NORMALIZADA']].astype(str), index=False)
+        repeticion = contenido.groupby(contenido, sort=False).cumcount()
+        return contenido.map('{:016x}'.format) + '-' + repeticion.astype(str)
+    
+    def sello_archivo(self, archivo):
+        """Tamaño y fecha de modificación del archivo (para saber si cambió desde la última corrida)"""
+        try:
+            stat = os.stat(archivo)
+            return (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return None
+    
+    def cargar_libro(self, callback=None):
+        """
+        Carga el libro de conciliación de corridas anteriores (o uno vacío)
+        El libro guarda, por ruta completa del archivo, lo ya extraído de cada archivo de control
+        y del hospital (dos liquidaciones con el mismo nombre en carpetas distintas son entradas distintas)
+        Un libro de una versión anterior se descarta y se empieza uno nuevo
+        """
+        libro = {'version': 3, 'control': {}, 'hospital': {}}
+        if os.path.exists(self.archivo_libro):
+            try:
+                guardado = pd.read_pickle(self.archivo_libro)
+                if guardado.get('version') == libro['version']:
+                    libro = guardado
+                if callback:
+                    callback(f"📚 Libro de conciliación: {len(libro['control'])} archivos de control y "
+                             f"{len(libro['hospital'])} del hospital de corridas anteriores")
+            except Exception as e:
+                if callback:
+                    callback(f"⚠️  No se pudo leer el libro de conciliación, se empieza uno nuevo: {str(e)}")
+        return libro
+    
+    def guardar_libro(self, callback=None):
+        """Guarda el libro de conciliación para la próxima corrida"""
+        if self.libro is None:
+            return
+        try:
+            temporal = self.archivo_libro + '.tmp'
+            pd.to_pickle(self.libro, temporal)
+            os.replace(temporal, self.archivo_libro)
+            if callback:
+                callback(f"📚 Libro de conciliación actualizado: {self.archivo_libro}")
+        except Exception as e:
+            if callback:
+                callback(f"Error guardando el libro de conciliación: {str(e)}")
+    
+    def borrar_libro(self):
+        """Borra el libro de conciliación: la próxima corrida vuelve a procesar todo desde cero"""
+        self.libro = None
+        if os.path.exists(self.archivo_libro):
+            os.remove(self.archivo_libro)
+    
+    def en_libro(self, seccion, archivo):
+        """Indica si el archivo ya está en el libro y no cambió desde que se procesó"""
+        if self.libro is None:
+            return False
+        entrada = self.libro[seccion].get(os.path.abspath(archivo))
+        return entrada is not None and entrada['sello'] == self.sello_archivo(archivo)
+    
+    def registrar_en_libro(self, seccion, archivo, df, callback=None, **extra):
+        """Guarda (o reemplaza) en el libro lo extraído de un archivo nuevo o modificado"""
+        ruta = os.path.abspath(archivo)
+        anterior = self.libro[seccion].get(ruta)
+        
+        # Archivo de control modificado: informar cuántas visitas son realmente nuevas
+        if seccion == 'control' and anterior is not None and callback:
+            conocidas = df['HASH_VISITA'].isin(anterior['df']['HASH_VISITA']).sum()
+            callback(f"🔄 Archivo modificado: {len(df) - conocidas} visitas nuevas, {conocidas} ya conocidas")
+        
+        self.libro[seccion][ruta] = {'sello': self.sello_archivo(archivo),
+                                     'nombre': os.path.basename(archivo), 'df': df, **extra}
+    
+    def quitar_del_libro(self, seccion, archivo, callback=None):
+        """Quita del libro un archivo que ya no se pudo volver a extraer, para no conciliar sus datos viejos"""
+        if self.libro[seccion].pop(os.path.abspath(archivo), None) is not None and callback:
+            callback(f"⚠️  {os.path.abspath(archivo)} se quita del libro: no se pudo volver a procesar")
+    
+    def frames_del_libro(self, seccion, archivos, callback=None):
+        """
+        DataFrames de todos los archivos del libro (los de esta corrida y los anteriores), en orden
+        Los archivos de corridas anteriores que ya no existen en disco se quitan del libro con un aviso:
+        si se movieron o se reexportaron con otro nombre, sus datos se contarían dos veces
+        """
+        seleccionados = {os.path.abspath(archivo) for archivo in archivos}
+        for ruta in [ruta for ruta in self.libro[seccion] if ruta not in seleccionados and not os.path.exists(ruta)]:
+            if callback:
+                callback(f"⚠️  {ruta} ya no existe: se quita del libro")
+            del self.libro[seccion][ruta]
+        
+        anteriores = [ruta for ruta in self.libro[seccion] if ruta not in seleccionados]
+        if anteriores and callback:
+            callback(f"📚 Se suman {len(anteriores)} archivos de corridas anteriores: {', '.join(anteriores)}")
+        return [entrada['df'] for entrada in self.libro[seccion].values() if entrada['df'] is not None]
+    
+    def emparejar_visitas(self, hc_presentes, hc_hospital):
+        """
+        Empareja visitas por multiplicidad: la n-ésima fila del hospital con una HC
+        paga la n-ésima fila presente con esa misma HC
+        Devuelve una máscara booleana con las filas presentes que quedaron pagadas
+        """
+        # Orden de aparición de cada visita dentro de su HC
+        orden_presente = hc_presentes.groupby(hc_presentes, sort=False).cumcount()
+        
+        # Cantidad de pagos del hospital por HC
+        pagos_por_hc = hc_hospital.value_counts()
+        pagos_disponibles = hc_presentes.map(pagos_por_hc).fillna(0)
+        
+        return orden_presente < pagos_disponibles
+    
     def procesar_archivos_hospital(self, callback=None):
         """
         Procesa los archivos del hospital y elimina las HC que coinciden
@@ -178,64 +418,76 @@ class HistoriaClinicaProcessor:
         
         hc_presentes = set(self.df_presentes['HC_NORMALIZADA'].tolist())
         ids_presentes = set(self.df_presentes['ID_FILA'].tolist())
-        ids_encontrados_hospital = set()
         
-        # Para detectar pagos "en contra"
+        # Todas las filas válidas del hospital (para emparejar y detectar pagos "en contra")
         todas_hc_hospital = []
         
         if callback:
             callback(f"Historias clínicas únicas presentes: {len(hc_presentes)}")
             callback(f"Total de filas/visitas presentes: {len(ids_presentes)}")
         
+        # Leer y normalizar en paralelo, un archivo por proceso, solo los que no están en el libro
+        pendientes = [archivo for archivo in self.archivos_hospital if not self.en_libro('hospital', archivo)]
+        if callback:
+            callback(f"Cargando {len(pendientes)} archivos del hospital...")
+        with self.tiempos.stage('carga_archivos_hospital'):
+            resultados = dict(zip(pendientes, map_files(cargar_archivo_hospital, pendientes,
+                                                        max_workers=self.max_workers)))
+        
         for archivo_hospital in self.archivos_hospital:
-            try:
-                if callback:
-                    callback(f"Procesando archivo del hospital: {os.path.basename(archivo_hospital)}")
-                
-                df_hospital = pd.read_excel(archivo_hospital)
-                
-                # Encontrar columna HC en archivo del hospital
-                col_hc_hospital = self.encontrar_columna_hc(df_hospital)
-                
-                if not col_hc_hospital:
+            if callback:
+                callback(f"Procesando archivo del hospital: {os.path.basename(archivo_hospital)}")
+            
+            if archivo_hospital in resultados:
+                resultado, error = resultados[archivo_hospital]
+                if error is not None:
                     if callback:
-                        callback(f"  No se encontró columna HC en {os.path.basename(archivo_hospital)}")
+                        callback(f"Error procesando {os.path.basename(archivo_hospital)}: {str(error)}")
+                    if self.libro is not None:
+                        self.quitar_del_libro('hospital', archivo_hospital, callback)
                     continue
                 
+                col_hc_hospital, df_hospital, tiempos_archivo = resultado
+                self.tiempos.add_file(archivo_hospital, 'hospital', worker=tiempos_archivo)
+                if self.libro is not None:
+                    self.registrar_en_libro('hospital', archivo_hospital, df_hospital, col_hc=col_hc_hospital)
+            else:
+                entrada = self.libro['hospital'][os.path.abspath(archivo_hospital)]
+                col_hc_hospital, df_hospital = entrada['col_hc'], entrada['df']
                 if callback:
-                    callback(f"  Columna Historia Clínica encontrada: {col_hc_hospital}")
-                
-                # Procesar cada fila del hospital
-                for idx, row in df_hospital.iterrows():
-                    hc_norm = self.normalizar_hc(row[col_hc_hospital])
-                    if hc_norm is not None:
-                        # Agregar a lista completa para análisis "en contra"
-                        fila_hospital = row.copy()
-                        fila_hospital['HC_NORMALIZADA'] = hc_norm
-                        fila_hospital['ARCHIVO_HOSPITAL'] = os.path.basename(archivo_hospital)
-                        todas_hc_hospital.append(fila_hospital)
-                        
-                        # Buscar coincidencias con presentes para marcar como pagadas
-                        filas_candidatas = self.df_presentes[
-                            (self.df_presentes['HC_NORMALIZADA'] == hc_norm) &
-                            (~self.df_presentes['ID_FILA'].isin(ids_encontrados_hospital))
-                        ]
-                        
-                        if len(filas_candidatas) > 0:
-                            # Marcar la primera fila encontrada como pagada
-                            id_fila = filas_candidatas.iloc[0]['ID_FILA']
-                            ids_encontrados_hospital.add(id_fila)
-                
-                if callback:
-                    callback(f"  HC válidas encontradas en este archivo: {len([h for h in todas_hc_hospital if h['ARCHIVO_HOSPITAL'] == os.path.basename(archivo_hospital)])}")
-                
-            except Exception as e:
+                    callback("  ♻️  Sin cambios, se reutiliza del libro")
+            
+            if not col_hc_hospital:
                 if callback:
-                    callback(f"Error procesando {os.path.basename(archivo_hospital)}: {str(e)}")
+                    callback(f"  No se encontró columna HC en {os.path.basename(archivo_hospital)}")
+                continue
+            
+            if callback:
+                callback(f"  Columna Historia Clínica encontrada: {col_hc_hospital}")
+            
+            todas_hc_hospital.append(df_hospital)
+            
+            if callback:
+                callback(f"  HC válidas encontradas en este archivo: {len(df_hospital)}")
+        
+        # Con el libro se concilian también las liquidaciones de corridas anteriores
+        if self.libro is not None:
+            todas_hc_hospital = self.frames_del_libro('hospital', self.archivos_hospital, callback)
+            self.guardar_libro(callback)
+        
+        with self.tiempos.stage('emparejamiento', rows=len(self.df_presentes)):
+            if todas_hc_hospital:
+                df_hospital_completo = pd.concat(todas_hc_hospital)
+            else:
+                df_hospital_completo = pd.DataFrame(columns=['HC_NORMALIZADA', 'ARCHIVO_HOSPITAL'])
+            
+            # Marcar como pagadas las visitas presentes emparejadas con una fila del hospital
+            pagados = self.emparejar_visitas(self.df_presentes['HC_NORMALIZADA'],
+                                             df_hospital_completo['HC_NORMALIZADA'])
+            ids_encontrados_hospital = set(self.df_presentes.loc[pagados, 'ID_FILA'])
         
         # Procesar pagos "en contra" (están en hospital pero no en control)
         if todas_hc_hospital:
-            df_hospital_completo = pd.DataFrame(todas_hc_hospital)
             hc_solo_hospital = df_hospital_completo[~df_hospital_completo['HC_NORMALIZADA'].isin(hc_presentes)]
             
             if len(hc_solo_hospital) > 0:
@@ -250,9 +502,7 @@ class HistoriaClinicaProcessor:
         ids_no_pagados = ids_presentes - ids_encontrados_hospital
         
         # Filtrar el DataFrame
-        self.df_presentes = self.df_presentes[
-            self.df_presentes['ID_FILA'].isin(ids_no_pagados)
-        ].copy()
+        self.df_presentes = self.df_presentes[~pagados].copy()
         
         if callback:
             callback(f"Resumen:")
@@ -278,7 +528,7 @@ class HistoriaClinicaProcessor:
         if self.df_presentes is not None and not self.df_presentes.empty:
             try:
                 # Eliminar las columnas auxiliares antes de guardar
-                df_salida = self.df_presentes.drop(['HC_NORMALIZADA', 'ID_FILA'], axis=1)
+                df_salida = self.df_presentes.drop(['HC_NORMALIZADA', 'ID_FILA', 'HASH_VISITA'], axis=1, errors='ignore')
                 
                 # Ordenar por archivo origen y luego por HC para mejor visualización
                 if 'ARCHIVO_ORIGEN' in df_salida.columns:
@@ -286,7 +536,8 @@ class HistoriaClinicaProcessor:
                     if col_hc_original:
                         df_salida = df_salida.sort_values(by=['ARCHIVO_ORIGEN', col_hc_original])
                 
-                df_salida.to_excel(self.archivo_salida, index=False)
+                with self.tiempos.stage('escritura', self.archivo_salida, rows=len(df_salida)):
+                    df_salida.to_excel(self.archivo_salida, index=False)
                 if callback:
                     callback(f"💰 Discrepancias A FAVOR guardadas: {self.archivo_salida}")
                     callback(f"   Total visitas no pagadas: {len(df_salida)}")
@@ -308,7 +559,8 @@ class HistoriaClinicaProcessor:
                 # Ordenar por archivo hospital
                 df_contra = df_contra.sort_values(by='ARCHIVO_HOSPITAL')
                 
-                df_contra.to_excel(self.archivo_salida_contra, index=False)
+                with self.tiempos.stage('escritura', self.archivo_salida_contra, rows=len(df_contra)):
+                    df_contra.to_excel(self.archivo_salida_contra, index=False)
                 if callback:
                     callback(f"⚠️  Discrepancias EN CONTRA guardadas: {self.archivo_salida_contra}")
                     callback(f"   Total pagos sin correspondencia: {len(df_contra)}")
@@ -321,8 +573,17 @@ class HistoriaClinicaProcessor:
             if callback:
                 callback(f"✅ Sin discrepancias EN CONTRA - Todos los pagos corresponden")
         
+        self.guardar_tiempos(callback)
         return resultados_guardados > 0
     
+    def guardar_tiempos(self, callback=None):
+        """Guarda el reporte de tiempos de la corrida (JSON) y muestra el resumen en el log"""
+        try:
+            self.tiempos.save(self.archivo_tiempos)
+        except Exception as e:
+            if callback:
+                callback(f"Error guardando el reporte de tiempos: {str(e)}")
+    
     def abrir_resultados(self, callback=None):
         """
         Abre los archivos de resultados
@@ -357,6 +618,50 @@ class HistoriaClinicaProcessor:
                     callback(f"No se pudo abrir automáticamente {archivo}: {str(e)}")
                     callback(f"Por favor, abra manualmente: {archivo}")
 
+def cargar_archivo_hospital(archivo_hospital):
+    """
+    Lee un archivo del hospital y normaliza sus HC (se ejecuta en un proceso aparte)
+    Devuelve (columna HC, DataFrame con HC_NORMALIZADA y ARCHIVO_HOSPITAL, tiempos por etapa),
+    con columna y DataFrame en None si el archivo no tiene columna HC
+    """
+    processor = HistoriaClinicaProcessor()
+    tiempos = StageTimer()
+    
+    # Encontrar columna HC en archivo del hospital (solo con el encabezado)
+    with tiempos('deteccion_columnas'):
+        col_hc_hospital = processor.encontrar_columna_hc(read_excel_header(archivo_hospital))
+    if not col_hc_hospital:
+        return None, None, tiempos.summary(reader=reader_used(archivo_hospital))
+    
+    # Archivos muy grandes: leer en streaming y quedarse lote por lote solo con las HC válidas
+    if should_stream(archivo_hospital):
+        lotes, filas = [], 0
+        iterador = iter_excel_batches(archivo_hospital, dtype=object)
+        while True:
+            with tiempos('carga'):
+                lote = next(iterador, None)
+            if lote is None:
+                break
+            filas += len(lote)
+            with tiempos('normalizacion'):
+                lote['HC_NORMALIZADA'] = processor.claves_hc(processor.normalizar_columna_hc(lote[col_hc_hospital]))
+                lotes.append(lote.dropna(subset=['HC_NORMALIZADA']))
+        df_hospital = pd.concat(lotes).infer_objects() if lotes else pd.DataFrame(columns=['HC_NORMALIZADA'])
+        df_hospital['ARCHIVO_HOSPITAL'] = os.path.basename(archivo_hospital)
+        return col_hc_hospital, df_hospital, tiempos.summary(filas, reader_used(archivo_hospital))
+    
+    # Los pagos "en contra" se guardan con todas sus columnas
+    with tiempos('carga'):
+        df_hospital = read_excel_cached(archivo_hospital)
+    filas = len(df_hospital)
+    
+    # Normalizar HC de todo el archivo y descartar las inválidas
+    with tiempos('normalizacion'):
+        df_hospital['HC_NORMALIZADA'] = processor.claves_hc(processor.normalizar_columna_hc(df_hospital[col_hc_hospital]))
+        df_hospital = df_hospital.dropna(subset=['HC_NORMALIZADA'])
+        df_hospital['ARCHIVO_HOSPITAL'] = os.path.basename(archivo_hospital)
+    return col_hc_hospital, df_hospital, tiempos.summary(filas, reader_used(archivo_hospital))
+
 class HistoriaClinicaGUI:
     def __init__(self, root):
         self.root = root
@@ -428,7 +733,17 @@ class HistoriaClinicaGUI:
         
         self.open_results_btn = ttk.Button(action_frame, text="Abrir Resultados", 
                                           command=self.abrir_resultados, state='disabled')
-        self.open_results_btn.pack(side=tk.LEFT)
+        self.open_results_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        # Libro de conciliación entre corridas mensuales
+        self.usar_libro_var = tk.BooleanVar(value=False)
+        usar_libro_check = ttk.Checkbutton(action_frame, text="Usar libro de conciliación", 
+                                           variable=self.usar_libro_var)
+        usar_libro_check.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.reset_ledger_btn = ttk.Button(action_frame, text="Reiniciar Libro", 
+                                          command=self.reiniciar_libro)
+        self.reset_ledger_btn.pack(side=tk.LEFT)
         
         # Frame para el log de salida
         log_frame = ttk.LabelFrame(main_frame, text="Log de Procesamiento", padding="5")
@@ -469,7 +784,7 @@ class HistoriaClinicaGUI:
         """Seleccionar archivos de control"""
         archivos = filedialog.askopenfilenames(
             title="Seleccionar archivos de control (Excel del usuario - varios meses)",
-            filetypes=[("Excel files", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Excel, CSV or Parquet files", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         
         if archivos:
@@ -487,7 +802,7 @@ class HistoriaClinicaGUI:
         """Seleccionar archivos del hospital"""
         archivos = filedialog.askopenfilenames(
             title="Seleccionar archivos del hospital (Excel)",
-            filetypes=[("Excel files", "*.xlsx *.xls"), ("Todos los archivos", "*.*")]
+            filetypes=[("Excel, CSV or Parquet files", "*.xlsx *.xls *.csv *.gz *.parquet"), ("Todos los archivos", "*.*")]
         )
         
         if archivos:
@@ -514,6 +829,8 @@ class HistoriaClinicaGUI:
         # Deshabilitar botones durante el procesamiento
         self.process_btn.config(state='disabled')
         self.clear_btn.config(state='disabled')
+        self.reset_ledger_btn.config(state='disabled')
+        self.processor.usar_libro = self.usar_libro_var.get()
         self.progress_var.set("Procesando...")
         self.progress_bar.start()
         
@@ -581,6 +898,8 @@ class HistoriaClinicaGUI:
             self.log_message(f"• A favor: {self.processor.archivo_salida}")
         if os.path.exists(self.processor.archivo_salida_contra):
             self.log_message(f"• En contra: {self.processor.archivo_salida_contra}")
+        if os.path.exists(self.processor.archivo_tiempos):
+            self.log_message(f"• Tiempos por etapa: {self.processor.archivo_tiempos}")
         
         self.log_message("\n📋 IMPORTANTE:")
         self.log_message("• A FAVOR = El hospital te debe dinero")  
@@ -601,6 +920,7 @@ class HistoriaClinicaGUI:
         # Rehabilitar botones
         self.verificar_archivos_completos()
         self.clear_btn.config(state='normal')
+        self.reset_ledger_btn.config(state='normal')
         
         if exito:
             # Habilitar botón de abrir resultados si hay archivos
@@ -621,6 +941,16 @@ class HistoriaClinicaGUI:
         """Abre los archivos de resultados"""
         self.processor.abrir_resultados(callback=self.log_message)
     
+    def reiniciar_libro(self):
+        """Borra el libro de conciliación para que la próxima corrida procese todo desde cero"""
+        if messagebox.askyesno("Confirmar", "¿Está seguro de que desea borrar el libro de conciliación?\n"
+                               "La próxima corrida volverá a leer todos los archivos."):
+            try:
+                self.processor.borrar_libro()
+                self.log_message(f"📚 Libro de conciliación borrado: {self.processor.archivo_libro}")
+            except Exception as e:
+                messagebox.showerror("Error", f"No se pudo borrar el libro de conciliación: {str(e)}")
+    
     def limpiar_todo(self):
         """Limpia todos los datos y reinicia la interfaz"""
         # Confirmar con el usuario
@@ -683,4 +1013,5 @@ def main():
         messagebox.showerror("Error Fatal", f"Error inesperado: {str(e)}")
 
 if __name__ == "__main__":
+    freeze_support()  # Necesario para el pool de procesos en ejecutables (Windows)
     main()
\ No newline at end of file
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import os
 import re
 from pathlib import Path
@@ -6,6 +7,9 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 import subprocess
 import sys
+from cache_excel import read_excel_cached, read_excel_header, should_stream, iter_excel_batches, excel_engine, reader_used
+from carga_paralela import map_files
+from multiprocessing import freeze_support
 
 class HistoriaClinicaProcessor:
     def __init__(self):
@@ -13,6 +17,7 @@ class HistoriaClinicaProcessor:
         self.archivos_hospital = []
         self.df_presentes = None
         self.archivo_salida = "presentes_no_pagados.xlsx"
+        self.max_workers = None  # Procesos para cargar archivos del hospital (None = GUITA_ZOKO_WORKERS)
         
     def normalizar_hc(self, valor):
         """
@@ -45,6 +50,70 @@ class HistoriaClinicaProcessor:
         
         return None
     
+    def normalizar_columna_hc(self, serie):
+        """
+        Versión vectorizada de normalizar_hc para una columna completa
+        Normaliza cada texto distinto una sola vez y expande el resultado a todas las filas
+        Devuelve un DataFrame compacto con el mismo índice:
+        - HC_NUM: HC numérica como int64 (0 si la HC es especial o inválida)
+        - HC_ESPECIAL: clave SIN_HC_/HC_0_/ESPECIAL_ (None si la HC es numérica o inválida)
+        """
+        validos = serie.notna().to_numpy()
+        
+        # Convertir a string (igual que str(valor)) y agrupar valores repetidos
+        codigos, unicos = pd.factorize(serie[validos].astype(str))
+        valor_str = pd.Series(unicos, dtype=object).str.strip().str.lower()
+        sufijo = valor_str.str.replace(' ', '_', regex=False)
+        
+        num_unicos = np.zeros(len(valor_str), dtype='int64')
+        especial_unicos = np.full(len(valor_str), None, dtype=object)
+        
+        # Pacientes sin HC
+        sin_hc = np.zeros(len(valor_str), dtype=bool)
+        for palabra in ['sin h.c', 'sin hc', 'sin historia']:
+            sin_hc |= valor_str.str.contains(palabra, regex=False).to_numpy(dtype=bool)
+        especial_unicos[sin_hc] = ('SIN_HC_' + sufijo[sin_hc]).to_numpy()
+        
+        # Extraer el primer número de la cadena
+        numeros = valor_str.str.extract(r'(\d+)', expand=False)
+        numeros[sin_hc] = np.nan
+        con_numero = numeros.dropna()
+        
+        # Números que no entran en int64 o con dígitos no ASCII: se normalizan celda por celda
+        celda_a_celda = (con_numero.str.len() > 18) | ~con_numero.str.fullmatch(r'[0-9]+')
+        for pos in con_numero.index[celda_a_celda.to_numpy(dtype=bool)]:
+            especial_unicos[pos] = self.normalizar_hc(unicos[pos])
+        numero = pd.to_numeric(con_numero[~celda_a_celda]).astype('int64')
+        
+        # Manejar HC = 0 como caso especial
+        ceros = numero.index[numero.to_numpy() == 0]
+        especial_unicos[ceros] = ('HC_0_' + sufijo[ceros]).to_numpy()
+        no_ceros = numero[numero != 0]
+        num_unicos[no_ceros.index] = no_ceros.to_numpy()
+        
+        # Si no hay números pero hay contenido, tratarlo como caso especial
+        especiales = ~sin_hc & numeros.isna().to_numpy() & (valor_str != '').to_numpy()
+        especial_unicos[especiales] = ('ESPECIAL_' + sufijo[especiales]).to_numpy()
+        
+        # Expandir de valores únicos a filas
+        hc_num = np.zeros(len(serie), dtype='int64')
+        hc_especial = np.full(len(serie), None, dtype=object)
+        hc_num[validos] = num_unicos[codigos]
+        hc_especial[validos] = especial_unicos[codigos]
+        
+        return pd.DataFrame({'HC_NUM': hc_num, 'HC_ESPECIAL': hc_especial}, index=serie.index)
+    
+    def claves_hc(self, hc_compacta):
+        """
+        Combina HC_NUM y HC_ESPECIAL en una sola clave por fila, igual a la de normalizar_hc
+        (int para HC numéricas, string para casos especiales, None para HC inválidas)
+        """
+        claves = hc_compacta['HC_ESPECIAL'].astype(object)
+        claves = claves.where(claves.notna(), None)
+        numericas = hc_compacta['HC_NUM'] > 0
+        claves[numericas] = hc_compacta['HC_NUM'][numericas].astype(object)
+        return claves
+    
     def encontrar_columna_hc(self, df):
         """
         Encuentra la columna que contiene las historias clínicas
@@ -87,7 +156,7 @@ class HistoriaClinicaProcessor:
         
         archivo = filedialog.askopenfilename(
             title="Seleccionar archivo de control (Excel del usuario)",
-            filetypes=[("Excel files", "*.xlsx *.xls")]
+            filetypes=[("Excel, CSV or Parquet files", "*.xlsx *.xls *.csv *.gz *.parquet")]
         )
         
         if archivo:
@@ -105,7 +174,7 @@ class HistoriaClinicaProcessor:
         
         archivos = filedialog.askopenfilenames(
             title="Seleccionar archivos del hospital (Excel)",
-            filetypes=[("Excel files", "*.xlsx *.xls")]
+            filetypes=[("Excel, CSV or Parquet files", "*.xlsx *.xls *.csv *.gz *.parquet")]
         )
         
         if archivos:
@@ -123,13 +192,13 @@ class HistoriaClinicaProcessor:
         """
         try:
             print(f"\nProcesando archivo de control...")
-            df = pd.read_excel(self.archivo_control)
+            encabezado = read_excel_header(self.archivo_control)
             
-            print(f"Columnas encontradas en archivo de control: {list(df.columns)}")
+            print(f"Columnas encontradas en archivo de control: {list(encabezado.columns)}")
             
-            # Encontrar columnas relevantes
-            col_hc = self.encontrar_columna_hc(df)
-            col_estado = self.encontrar_columna_estado(df)
+            # Encontrar columnas relevantes (solo con el encabezado)
+            col_hc = self.encontrar_columna_hc(encabezado)
+            col_estado = self.encontrar_columna_estado(encabezado)
             
             if not col_hc:
                 raise ValueError("No se pudo encontrar la columna de Historia Clínica")
@@ -139,11 +208,14 @@ class HistoriaClinicaProcessor:
             print(f"Columna Historia Clínica: {col_hc}")
             print(f"Columna Estado: {col_estado}")
             
+            # Se guardan todas las columnas en la salida; Estado se lee sin conversión
+            df = read_excel_cached(self.archivo_control, dtype={col_estado: object})
+            
             # Filtrar solo los presentes
             df_filtrado = df[df[col_estado].str.upper() == 'P'].copy()
             
             # Normalizar HC para comparación posterior
-            df_filtrado['HC_NORMALIZADA'] = df_filtrado[col_hc].apply(self.normalizar_hc)
+            df_filtrado['HC_NORMALIZADA'] = self.claves_hc(self.normalizar_columna_hc(df_filtrado[col_hc]))
             
             # Crear identificador único por fila para manejar múltiples visitas
             df_filtrado['ID_FILA'] = df_filtrado.index.astype(str) + '_' + df_filtrado['HC_NORMALIZADA'].astype(str)
@@ -158,6 +230,7 @@ class HistoriaClinicaProcessor:
             
             self.df_presentes = df_filtrado
             
+            print(f"Lector de Excel usado: {reader_used(self.archivo_control)}")
             print(f"Total de registros en archivo de control: {len(df)}")
             print(f"Registros con estado 'Presente': {len(df_filtrado)}")
             
@@ -172,6 +245,22 @@ class HistoriaClinicaProcessor:
             print(f"Error procesando archivo de control: {str(e)}")
             return False
     
+    def emparejar_visitas(self, hc_hospital):
+        """
+        Empareja cada pago del hospital con una visita presente de la misma HC
+        Numera las visitas dentro de cada HC en ambos lados y une por (HC, número de visita),
+        así cada pago consume una sola visita. Devuelve el conjunto de ID_FILA pagados
+        """
+        presentes = self.df_presentes[['HC_NORMALIZADA', 'ID_FILA']].copy()
+        presentes['HC_NORMALIZADA'] = presentes['HC_NORMALIZADA'].astype(object)
+        presentes['NUM_VISITA'] = presentes.groupby('HC_NORMALIZADA', sort=False).cumcount()
+        
+        pagos = pd.DataFrame({'HC_NORMALIZADA': pd.Series(hc_hospital, dtype=object)})
+        pagos['NUM_VISITA'] = pagos.groupby('HC_NORMALIZADA', sort=False).cumcount()
+        
+        pagados = presentes.merge(pagos, on=['HC_NORMALIZADA', 'NUM_VISITA'], how='inner')
+        return set(pagados['ID_FILA'])
+    
     def procesar_archivos_hospital(self):
         """
         Procesa los archivos del hospital y elimina las HC que coinciden
@@ -183,56 +272,38 @@ class HistoriaClinicaProcessor:
         
         hc_presentes = set(self.df_presentes['HC_NORMALIZADA'].tolist())
         ids_presentes = set(self.df_presentes['ID_FILA'].tolist())
-        ids_encontrados_hospital = set()
+        
+        # HC normalizadas de todos los archivos del hospital (una entrada por pago)
+        hc_hospital_total = []
         
         print(f"\nHistorias clínicas únicas presentes: {len(hc_presentes)}")
         print(f"Total de filas/visitas presentes: {len(ids_presentes)}")
         
-        for archivo_hospital in self.archivos_hospital:
-            try:
-                print(f"\nProcesando archivo del hospital: {os.path.basename(archivo_hospital)}")
-                df_hospital = pd.read_excel(archivo_hospital)
-                
-                print(f"Columnas en archivo del hospital: {list(df_hospital.columns)}")
-                
-                # Encontrar columna HC en archivo del hospital
-                col_hc_hospital = self.encontrar_columna_hc(df_hospital)
-                
-                if not col_hc_hospital:
-                    print(f"  No se encontró columna HC en {os.path.basename(archivo_hospital)}")
-                    continue
-                
-                print(f"  Columna Historia Clínica encontrada: {col_hc_hospital}")
-                
-                # Normalizar HC del hospital
-                hc_hospital = []
-                for hc in df_hospital[col_hc_hospital]:
-                    hc_norm = self.normalizar_hc(hc)
-                    if hc_norm is not None:
-                        hc_hospital.append(hc_norm)
-                
-                print(f"  HC válidas encontradas en este archivo: {len(hc_hospital)}")
-                
-                # Para cada HC en el hospital, buscar coincidencias en presentes
-                # y marcar las filas como encontradas (una por una)
-                for hc_hosp in hc_hospital:
-                    # Buscar filas en presentes que tengan esta HC y aún no estén marcadas como encontradas
-                    filas_candidatas = self.df_presentes[
-                        (self.df_presentes['HC_NORMALIZADA'] == hc_hosp) &
-                        (~self.df_presentes['ID_FILA'].isin(ids_encontrados_hospital))
-                    ]
-                    
-                    if len(filas_candidatas) > 0:
-                        # Marcar la primera fila encontrada como pagada
-                        id_fila = filas_candidatas.iloc[0]['ID_FILA']
-                        ids_encontrados_hospital.add(id_fila)
-                
-                coincidencias_este_archivo = len([id for id in ids_encontrados_hospital 
-                                                if id.split('_')[1:] == [hc for hc in hc_hospital if str(hc) in id]])
-                print(f"  Filas marcadas como pagadas en este archivo: {len(ids_encontrados_hospital) - len(ids_encontrados_hospital.intersection(set()))}") 
-                
-            except Exception as e:
-                print(f"Error procesando {os.path.basename(archivo_hospital)}: {str(e)}")
+        # Leer y normalizar los archivos en paralelo, un archivo por proceso
+        resultados = map_files(cargar_hc_hospital, self.archivos_hospital,
+                               max_workers=self.max_workers)
+        
+        for archivo_hospital, (resultado, error) in zip(self.archivos_hospital, resultados):
+            print(f"\nProcesando archivo del hospital: {os.path.basename(archivo_hospital)}")
+            
+            if error is not None:
+                print(f"Error procesando {os.path.basename(archivo_hospital)}: {str(error)}")
+                continue
+            
+            columnas, col_hc_hospital, hc_hospital, lector = resultado
+            print(f"Columnas en archivo del hospital: {columnas}")
+            print(f"  Lector de Excel usado: {lector}")
+            
+            if not col_hc_hospital:
+                print(f"  No se encontró columna HC en {os.path.basename(archivo_hospital)}")
+                continue
+            
+            print(f"  Columna Historia Clínica encontrada: {col_hc_hospital}")
+            print(f"  HC válidas encontradas en este archivo: {len(hc_hospital)}")
+            hc_hospital_total.extend(hc_hospital)
+        
+        # Cada pago del hospital marca como pagada una visita presente (la primera libre de esa HC)
+        ids_encontrados_hospital = self.emparejar_visitas(hc_hospital_total)
         
         # Eliminar las filas encontradas en el hospital del DataFrame de presentes
         ids_no_pagados = ids_presentes - ids_encontrados_hospital
@@ -320,6 +391,7 @@ class HistoriaClinicaProcessor:
         Ejecuta el proceso completo
         """
         print("=== PROCESADOR DE HISTORIAS CLÍNICAS ===\n")
+        print(f"Lector de Excel configurado: {excel_engine()}\n")
         
         # Paso 1: Seleccionar archivo de control
         print("Paso 1: Seleccionar archivo de control del usuario")
@@ -371,6 +443,36 @@ class HistoriaClinicaProcessor:
         print("• HC=0 y 'sin HC' también se consideran válidos para cobro")
         print("• Las discrepancias mostradas requieren verificación/pago")
 
+def cargar_hc_hospital(archivo_hospital):
+    """
+    Lee la columna HC de un archivo del hospital y la normaliza (se ejecuta en un proceso aparte)
+    Devuelve (columnas del archivo, columna HC, lista de HC válidas, lector usado);
+    sin columna HC, (columnas, None, [], lector usado)
+    """
+    processor = HistoriaClinicaProcessor()
+    encabezado = read_excel_header(archivo_hospital)
+    columnas = list(encabezado.columns)
+    
+    # Encontrar columna HC en archivo del hospital (solo con el encabezado)
+    col_hc_hospital = processor.encontrar_columna_hc(encabezado)
+    if not col_hc_hospital:
+        return columnas, None, [], reader_used(archivo_hospital)
+    
+    # Archivos muy grandes: leer la columna HC en streaming y normalizar lote por lote
+    if should_stream(archivo_hospital):
+        hc_hospital = []
+        for lote in iter_excel_batches(archivo_hospital, usecols=[col_hc_hospital], dtype=object):
+            hc_hospital.extend(processor.claves_hc(processor.normalizar_columna_hc(lote[col_hc_hospital])).dropna().tolist())
+        return columnas, col_hc_hospital, hc_hospital, reader_used(archivo_hospital)
+    
+    # Cargar solo la columna HC, sin conversión de tipos
+    df_hospital = read_excel_cached(archivo_hospital, usecols=[col_hc_hospital],
+                                    dtype={col_hc_hospital: object})
+    
+    # Normalizar HC del hospital
+    hc_hospital = processor.claves_hc(processor.normalizar_columna_hc(df_hospital[col_hc_hospital])).dropna().tolist()
+    return columnas, col_hc_hospital, hc_hospital, reader_used(archivo_hospital)
+
 def main():
     """
     Función principal
@@ -385,4 +487,5 @@ def main():
         input("Presione Enter para salir...")
 
 if __name__ == "__main__":
+    freeze_support()  # Necesario para el pool de procesos en ejecutables (Windows)
     main()
\ No newline at end of file
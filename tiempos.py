@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import contextlib
+from datetime import datetime
+from cache_excel import describe_readers
+
+
+def peak_memory_mb():
+    """Pico de memoria residente de este proceso en MB (None si no se puede medir)."""
+    try:
+        import resource
+    except ImportError:
+        counters = _windows_memory_counters()
+        return round(counters.PeakWorkingSetSize / (1024 * 1024), 1) if counters else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss viene en KB en Linux y en bytes en macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def current_memory_mb():
+    """Memoria residente actual de este proceso en MB (None si no se puede medir).
+
+    A diferencia del pico, baja cuando se libera memoria: restando dos lecturas se ve
+    cuánto creció el proceso durante un archivo aunque el worker venga de un fork o
+    ya haya procesado otros archivos.
+    """
+    if sys.platform == 'win32':
+        counters = _windows_memory_counters()
+        return round(counters.WorkingSetSize / (1024 * 1024), 1) if counters else None
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+
+def _windows_memory_counters():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS),
+                                               wintypes.DWORD]
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters
+    except Exception:
+        return None
+
+
+def file_size_mb(path):
+    """Tamaño del archivo en MB (None si no existe)."""
+    try:
+        return round(os.path.getsize(path) / (1024 * 1024), 3)
+    except OSError:
+        return None
+
+
+class StageTimer:
+    """Acumula segundos por etapa: with timer('carga'): ...
+
+    Es liviano y se puede devolver desde los procesos del pool: summary() junta los
+    tiempos con el aumento de memoria residente desde que se creó el timer. No se usa
+    el pico del proceso porque un worker creado con fork o reutilizado para varios
+    archivos arrastra el pico del padre o de los archivos anteriores.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.start_memory = current_memory_mb()
+
+    @contextlib.contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] = self.stages.get(stage, 0.0) + time.perf_counter() - start
+
+    def summary(self, rows=None, reader=None):
+        memory = current_memory_mb()
+        growth = round(memory - self.start_memory, 1) if memory is not None and self.start_memory is not None else None
+        return {'etapas': dict(self.stages), 'filas': rows, 'lector': reader, 'aumento_memoria_mb': growth}
+
+
+class RunReport:
+    """Tiempos de una corrida por etapa y por archivo, para el log y para un JSON.
+
+    Cada etapa se informa con log(mensaje) al terminar (el callback de la GUI o print)
+    y queda registrada con sus filas y filas/s; save() escribe el reporte con el tamaño
+    de cada archivo y el pico de memoria del proceso principal.
+    """
+
+    def __init__(self, engine, log=None):
+        self.engine = engine
+        self.log = log
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = []
+        self.files = []
+
+    @contextlib.contextmanager
+    def stage(self, name, file=None, rows=None):
+        """Mide una etapa del proceso principal; las filas se pueden fijar después con record['filas'] = n."""
+        record = {'etapa': name, 'archivo': os.path.basename(file) if file else None, 'filas': rows}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add_stage(record, time.perf_counter() - start)
+
+    def add_stage(self, record, seconds):
+        rows = record.get('filas')
+        record['segundos'] = round(seconds, 4)
+        record['filas_por_s'] = round(rows / seconds, 1) if rows and seconds > 0 else None
+        self.stages.append(record)
+        if self.log:
+            where = f" ({record['archivo']})" if record['archivo'] else ""
+            speed = f", {rows} filas, {record['filas_por_s']:.0f} filas/s" if record['filas_por_s'] else ""
+            self.log(f"  Tiempo {record['etapa']}{where}: {seconds:.2f} s{speed}")
+
+    def add_file(self, path, role, rows=None, worker=None, reader=None):
+        """Registra un archivo leído; worker es el summary() de un StageTimer medido en otro proceso.
+
+        reader es el lector que se usó realmente (cache_excel.reader_used).
+        """
+        if worker is not None:
+            rows = worker['filas'] if rows is None else rows
+            reader = worker['lector'] if reader is None else reader
+        entry = {'archivo': os.path.basename(path), 'rol': role, 'tamano_mb': file_size_mb(path), 'filas': rows,
+                 'lector': reader}
+        if worker is not None:
+            for name, seconds in worker['etapas'].items():
+                # La detección de columnas solo lee el encabezado: filas/s no dice nada ahí
+                stage_rows = None if name == 'deteccion_columnas' else rows
+                self.add_stage({'etapa': name, 'archivo': entry['archivo'], 'filas': stage_rows}, seconds)
+            entry['segundos'] = round(sum(worker['etapas'].values()), 4)
+            # Memoria residente que el worker retuvo al terminar el archivo (no es un pico)
+            entry['aumento_memoria_worker_mb'] = worker['aumento_memoria_mb']
+        self.files.append(entry)
+
+    def slowest_file(self):
+        """Archivo de entrada con más segundos sumando todas sus etapas (None si no hay ninguno)."""
+        inputs = {entry['archivo'] for entry in self.files}
+        totals = {}
+        for record in self.stages:
+            if record['archivo'] in inputs:
+                totals[record['archivo']] = totals.get(record['archivo'], 0.0) + record['segundos']
+        return max(totals.items(), key=lambda item: item[1]) if totals else None
+
+    def as_dict(self):
+        return {
+            'motor': self.engine,
+            'inicio': self.started_at.isoformat(timespec='seconds'),
+            'total_s': round(time.perf_counter() - self.start, 4),
+            'memoria_pico_mb': peak_memory_mb(),
+            'archivo_mas_lento': self.slowest_file(),
+            'etapas': self.stages,
+            'archivos': self.files,
+        }
+
+    def save(self, path):
+        """Escribe el reporte JSON, informa el resumen en el log y devuelve el diccionario."""
+        report = self.as_dict()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        if self.log:
+            memory = f", pico de memoria {report['memoria_pico_mb']} MB" if report['memoria_pico_mb'] else ""
+            self.log(f"Tiempo total: {report['total_s']:.1f} s{memory}")
+            self.log(f"Lector de Excel usado: {describe_readers(entry['lector'] for entry in self.files)}")
+            if report['archivo_mas_lento']:
+                name, seconds = report['archivo_mas_lento']
+                self.log(f"Archivo más lento: {name} ({seconds:.1f} s)")
+            self.log(f"Reporte de tiempos: {path}")
+        return report